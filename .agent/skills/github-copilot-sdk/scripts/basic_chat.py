@@ -1,6 +1,7 @@
 import asyncio
 import sys
 from copilot import CopilotClient
+from stdin_lines import read_line
 
 async def main():
     # Initialize the client
@@ -18,8 +19,9 @@ async def main():
         while True:
             # Get user input
             try:
-                user_input = input("\nYou: ")
-            except EOFError:
+                # Read off the event loop so it keeps running
+                user_input = await read_line("\nYou: ")
+            except (EOFError, asyncio.CancelledError):
                 break
             
             if user_input.lower() in ['exit', 'quit']:
@@ -4,6 +4,7 @@ import random
 from copilot import CopilotClient
 from copilot.tools import define_tool
 from pydantic import BaseModel, Field
+from stdin_lines import read_line
 
 # 1. Define input parameters using Pydantic
 class GetWeatherParams(BaseModel):
@@ -45,8 +46,9 @@ async def main():
         
         while True:
             try:
-                user_input = input("\nYou: ")
-            except EOFError:
+                # Read off the event loop so it keeps running
+                user_input = await read_line("\nYou: ")
+            except (EOFError, asyncio.CancelledError):
                 break
                 
             if user_input.lower() in ['exit', 'quit']:
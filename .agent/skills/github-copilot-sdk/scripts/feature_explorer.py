@@ -14,6 +14,23 @@ import os
 from copilot import CopilotClient
 from copilot.generated.session_events import SessionEventType
 
+# Public attribute names per type, so dir() runs once per class
+_methods_cache: dict[type, list[str]] = {}
+
+# Optional client capabilities, resolved once at import
+_CLIENT_CAPS = {
+    'list_models': hasattr(CopilotClient, 'list_models'),
+    'list_sessions': hasattr(CopilotClient, 'list_sessions'),
+}
+
+
+def public_names(obj) -> list[str]:
+    """Return the public attribute names of obj, cached by type."""
+    names = _methods_cache.get(type(obj))
+    if names is None:
+        names = _methods_cache[type(obj)] = [m for m in dir(obj) if not m.startswith('_')]
+    return names
+
 
 async def print_available_methods(obj, name: str):
     """Print available public methods and attributes of an object."""
@@ -21,7 +38,7 @@ async def print_available_methods(obj, name: str):
     print(f"Available methods/attributes on {name}:")
     print('='*60)
     
-    methods = [m for m in dir(obj) if not m.startswith('_')]
+    methods = public_names(obj)
     for method in methods:
         attr = getattr(obj, method)
         if callable(attr):
@@ -38,7 +55,7 @@ async def demo_model_selection(client):
     print("="*60)
     
     # Check if client has list_models method
-    if hasattr(client, 'list_models'):
+    if _CLIENT_CAPS['list_models']:
         print("\n📋 Attempting to list available models...")
         try:
             models = await client.list_models()
@@ -55,14 +72,11 @@ async def demo_model_selection(client):
         "streaming": True,
     })
     
-    collected_response = []
-    
     def handle_event(event):
         if event.type == SessionEventType.ASSISTANT_MESSAGE_DELTA:
             content = event.data.delta_content or ""
             sys.stdout.write(content)
             sys.stdout.flush()
-            collected_response.append(content)
         elif event.type == SessionEventType.SESSION_IDLE:
             print("\n")
     
@@ -94,14 +108,11 @@ async def demo_workspace(client):
         "streaming": True,
     })
     
-    collected_response = []
-    
     def handle_event(event):
         if event.type == SessionEventType.ASSISTANT_MESSAGE_DELTA:
             content = event.data.delta_content or ""
             sys.stdout.write(content)
             sys.stdout.flush()
-            collected_response.append(content)
         elif event.type == SessionEventType.SESSION_IDLE:
             print("\n")
     
@@ -141,7 +152,7 @@ async def demo_mcp_config(client):
         print("✅ Session created with MCP configuration (no error)")
         
         # Check what methods the session has related to MCP
-        mcp_methods = [m for m in dir(session) if 'mcp' in m.lower() or 'server' in m.lower()]
+        mcp_methods = [m for m in public_names(session) if 'mcp' in m.lower() or 'server' in m.lower()]
         if mcp_methods:
             print(f"📌 MCP-related methods: {mcp_methods}")
         
@@ -160,7 +171,7 @@ async def demo_session_management(client):
     print("="*60)
     
     # Check available session methods
-    if hasattr(client, 'list_sessions'):
+    if _CLIENT_CAPS['list_sessions']:
         print("\n📋 Listing existing sessions...")
         try:
             sessions = await client.list_sessions()
@@ -0,0 +1,52 @@
+"""
+Line input for the interactive example scripts.
+
+Lines are read on a daemon thread, so Ctrl-C exits at once even while a
+prompt is waiting for input.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+
+# Bytes read from stdin past the last line handed out
+_stdin_pending = bytearray()
+
+def _read_stdin_line(loop, future):
+    # os.read rather than input(): it holds no interpreter I/O lock, so a read
+    # still blocked at exit can't stall or abort interpreter shutdown
+    while b"\n" not in _stdin_pending:
+        chunk = os.read(sys.stdin.fileno(), 4096)
+        if not chunk:
+            break
+        _stdin_pending.extend(chunk)
+    end = _stdin_pending.find(b"\n")
+    if end < 0:
+        line = bytes(_stdin_pending) or None  # None marks end of input
+        _stdin_pending.clear()
+    else:
+        line = bytes(_stdin_pending[:end])
+        del _stdin_pending[:end + 1]
+    def settle():
+        if not future.done():
+            future.set_result(line)
+    try:
+        loop.call_soon_threadsafe(settle)
+    except RuntimeError:
+        pass  # Loop already closed
+
+async def read_line(prompt: str) -> str:
+    """Prompt and read one line of stdin on a daemon thread.
+
+    Unlike run_in_executor(None, input), a read pending at Ctrl-C doesn't
+    keep asyncio.run waiting for Enter.
+    """
+    print(prompt, end="", flush=True)
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    threading.Thread(target=_read_stdin_line, args=(loop, future), daemon=True).start()
+    line = await future
+    if line is None:
+        raise EOFError
+    return line.decode(errors="replace").rstrip("\r")
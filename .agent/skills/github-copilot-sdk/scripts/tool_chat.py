@@ -3,20 +3,25 @@ import sys
 import json
 from copilot import CopilotClient
 from copilot.generated.session_events import SessionEventType
+from stdin_lines import read_line
 
 
 def format_json(data):
     """Format data as indented JSON for display."""
-    try:
-        if isinstance(data, str):
-            return data
-        return json.dumps(data, indent=2, ensure_ascii=False)
-    except:
-        return str(data)
+    if isinstance(data, str):
+        return data
+    if isinstance(data, (dict, list, int, float, bool, type(None))):
+        try:
+            # default=str covers nested values json can't encode
+            return json.dumps(data, indent=2, ensure_ascii=False, default=str)
+        except (TypeError, ValueError):
+            # Non-string keys and circular references still fail
+            return str(data)
+    return str(data)
 
 
-# Track tool calls by their ID
-active_tool_calls = {}
+# Upper bound on tool calls awaiting a COMPLETE event
+MAX_ACTIVE_TOOL_CALLS = 1024
 
 
 async def main():
@@ -32,6 +37,9 @@ async def main():
         print("Session created. Type 'exit' or 'quit' to end.")
         print("-" * 50)
         
+        # Track tool calls by their ID, scoped to this session
+        active_tool_calls: dict[str, str] = {}
+        
         def handle_event(event):
             """Handle session events and display tool calls."""
             
@@ -42,6 +50,9 @@ async def main():
                 
                 # Store tool name for later use
                 if tool_call_id:
+                    # Drop the oldest entry if COMPLETE events went missing
+                    if len(active_tool_calls) >= MAX_ACTIVE_TOOL_CALLS:
+                        active_tool_calls.pop(next(iter(active_tool_calls)))
                     active_tool_calls[tool_call_id] = tool_name
                 
                 print(f"\n{'='*50}")
@@ -80,8 +91,9 @@ async def main():
         
         while True:
             try:
-                user_input = input("\nYou: ")
-            except EOFError:
+                # Read off the event loop so it keeps running
+                user_input = await read_line("\nYou: ")
+            except (EOFError, asyncio.CancelledError):
                 break
             
             if user_input.lower() in ['exit', 'quit']:
@@ -1,13 +1,421 @@
 import asyncio
-from typing import List
+import codecs
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import orjson
+import ormsgpack
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from copilot.generated.session_events import SessionEventType
 from domain.interfaces import SessionRepository, CopilotService, WorkspaceService, FileAttachmentRepository
 from domain.models import Session, Message
+from domain.tokens import count_tokens
 from api.deps import get_session_repo, get_copilot_service, get_workspace_service, get_global_state, get_file_attachment_repo, GlobalState
 
 router = APIRouter()
 
+# Coalesced stream deltas are flushed as a new frame once they reach this size;
+# only already-queued deltas are merged, so a larger cap adds no latency
+STREAM_FLUSH_THRESHOLD = 64 * 1024
+
+# WebSocket subprotocol a client can offer to exchange binary MessagePack frames
+MSGPACK_SUBPROTOCOL = "msgpack"
+
+# Seconds between flushes of pending session changes to the repository
+SESSION_FLUSH_INTERVAL = 0.5
+
+# Once more than MAX_SESSION_MESSAGES messages follow the last summary,
+# everything but the last KEEP_RECENT_MESSAGES is folded into the prompt-side
+# summary; the visible history itself is never rewritten
+MAX_SESSION_MESSAGES = 40
+KEEP_RECENT_MESSAGES = 20
+
+# Seconds a single assistant turn may take before it is abandoned
+TURN_TIMEOUT = 300
+
+_ROLE_LABELS = {"user": "Human", "assistant": "Assistant", "system": "Summary"}
+
+# Tool log entries persisted in the assistant message (blockquotes for UI
+# container styling); pre-encoded since the reply is buffered as UTF-8 bytes
+_TOOL_START_TMPL = "\n\n> 🔧 **Tool Call:** `%s`\n> \n> Arguments:\n> ```json\n> %s\n> ```\n\n".encode("utf-8")
+_TOOL_DONE_TMPL = "\n\n> ✅ **Tool Result:** `%s`\n\n".encode("utf-8")
+
+# Fixed envelope of JSON stream frames, completed with the encoded delta and "}"
+_STREAM_PREFIX = '{"type":"stream","content":'
+
+
+def _coalesce(frames: List[dict]) -> List[dict]:
+    """Merge adjacent stream deltas into as few frames as possible."""
+    merged = []
+    for frame in frames:
+        prev = merged[-1] if merged else None
+        if (
+            prev is not None
+            and frame["type"] == "stream"
+            and prev["type"] == "stream"
+            and len(prev["content"]) < STREAM_FLUSH_THRESHOLD
+        ):
+            prev["content"] += frame["content"]
+        else:
+            merged.append(frame)
+    return merged
+
+
+async def _drain(outbox: asyncio.Queue, websocket: WebSocket, msgpack_frames: bool = False):
+    """Single writer for the socket: sends queued frames in order.
+
+    Clients that negotiated msgpack get every frame as binary MessagePack;
+    everyone else gets JSON text.
+    """
+    if msgpack_frames:
+        async def write(frame: dict):
+            await websocket.send_bytes(ormsgpack.packb(frame, default=str, option=ormsgpack.OPT_NON_STR_KEYS))
+    else:
+        async def write(frame: dict):
+            # Text frames so browser clients can keep using JSON.parse on event.data
+            if frame["type"] == "stream":
+                # Hot path: only the delta needs escaping, the envelope is fixed
+                await websocket.send_text(_STREAM_PREFIX + orjson.dumps(frame["content"]).decode() + "}")
+            else:
+                await websocket.send_text(orjson.dumps(frame, default=str, option=orjson.OPT_NON_STR_KEYS).decode())
+    
+    while True:
+        frames = [await outbox.get()]
+        try:
+            while True:
+                frames.append(outbox.get_nowait())
+        except asyncio.QueueEmpty:
+            pass
+        for frame in _coalesce(frames):
+            await write(frame)
+
+def _decode_frame(message: dict, msgpack_frames: bool = False) -> dict:
+    """Parse an inbound frame straight from its raw text or bytes."""
+    text = message.get("text")
+    if text is not None:
+        return orjson.loads(text)
+    raw = message.get("bytes") or b"{}"
+    return ormsgpack.unpackb(raw) if msgpack_frames else orjson.loads(raw)
+
+
+async def _flush_session(session_repo: SessionRepository, session: Session):
+    """Save the session only if it changed since the last save."""
+    if session._dirty:
+        async with session_repo.lock(session.id):
+            # Deleted while this connection was open: don't bring it back
+            if await session_repo.get(session.id) is not session:
+                return
+            session._dirty = False
+            await session_repo.save(session)
+
+
+async def _periodic_flush(session_repo: SessionRepository, session: Session, interval: float = SESSION_FLUSH_INTERVAL):
+    """Debounce session saves: hot paths mark the session dirty instead."""
+    while True:
+        await asyncio.sleep(interval)
+        await _flush_session(session_repo, session)
+
+@dataclass
+class ChatContext:
+    """Per-connection state shared by the message handlers."""
+    session_id: str
+    session: Session
+    session_repo: SessionRepository
+    copilot_service: CopilotService
+    workspace_service: WorkspaceService
+    file_attachment_repo: FileAttachmentRepository
+    outbox: asyncio.Queue
+    compact_task: Optional[asyncio.Task] = None
+    # SDK session the last turn on this socket ran in
+    sdk_session: Any = None
+
+    def drop_sdk_session(self):
+        self.sdk_session = None
+
+    def send(self, frame: dict):
+        self.outbox.put_nowait(frame)
+
+
+@dataclass
+class TurnState:
+    """What the SDK event handlers accumulate over one assistant turn."""
+    emit: Callable[[dict], None]
+    # Single UTF-8 buffer for the whole reply, decoded once at the end
+    buf: bytearray = field(default_factory=bytearray)
+    used_tools: bool = False
+
+
+def _on_delta(event, turn: TurnState):
+    delta = event.data.delta_content
+    if not delta:
+        return
+    turn.buf.extend(delta.encode("utf-8"))
+    turn.emit({
+        "type": "stream",
+        "content": delta,
+    })
+
+
+def _on_tool_start(event, turn: TurnState):
+    turn.used_tools = True
+    tool_name = event.data.tool_name or "unknown"
+    args = event.data.arguments
+    
+    # Append tool start log to content for persistence
+    args_json = args.encode("utf-8") if isinstance(args, str) else orjson.dumps(args, default=str, option=orjson.OPT_NON_STR_KEYS)
+    turn.buf.extend(_TOOL_START_TMPL % (tool_name.encode("utf-8"), args_json))
+    
+    turn.emit({
+        "type": "tool_start",
+        "tool": tool_name,
+        "arguments": args,
+    })
+
+
+def _on_tool_complete(event, turn: TurnState):
+    tool_name = event.data.tool_name or "unknown"
+    result = event.data.result
+    
+    # Append tool complete log
+    turn.buf.extend(_TOOL_DONE_TMPL % tool_name.encode("utf-8"))
+    
+    turn.emit({
+        "type": "tool_complete",
+        "tool": tool_name,
+        "result": result.content if result else None,
+    })
+
+
+def _on_other(event, turn: TurnState):
+    pass
+
+
+# SDK event type -> handler; everything else is ignored
+EVENT_HANDLERS: Dict[Any, Callable[[Any, TurnState], None]] = {
+    SessionEventType.ASSISTANT_MESSAGE_DELTA: _on_delta,
+    SessionEventType.TOOL_EXECUTION_START: _on_tool_start,
+    SessionEventType.TOOL_EXECUTION_COMPLETE: _on_tool_complete,
+}
+
+
+async def _handle_set_model(data: dict, ctx: ChatContext):
+    session = ctx.session
+    session.model = data.get("model", session.model)
+    session._dirty = True
+    # The next turn's create_session sees the new model and replaces the SDK session
+    ctx.send({"type": "model_set", "model": session.model})
+
+
+async def _handle_message(data: dict, ctx: ChatContext):
+    session = ctx.session
+    copilot_service = ctx.copilot_service
+    workspace_service = ctx.workspace_service
+    send = ctx.send
+    
+    content = data.get("content", "")
+    attachment_ids = data.get("attachment_ids", [])
+    
+    # Retrieve file attachments from repository in one batch
+    attachments = []
+    if attachment_ids:
+        attachments = await ctx.file_attachment_repo.get_many(attachment_ids)
+    
+    # Create user message with attachments
+    user_msg = Message(role="user", content=content, attachments=attachments)
+    session.messages.append(user_msg)
+    session.token_count += count_tokens(content)
+    
+    # Update session name if first message
+    if len(session.messages) == 1:
+        session.name = content[:50] + ("..." if len(content) > 50 else "")
+    
+    session._dirty = True
+    
+    send({
+        "type": "user_message",
+        "message": user_msg.json_dict(),
+    })
+    
+    try:
+        # Use session workspace, fallback to current workspace if empty
+        effective_workspace = session.workspace or workspace_service.get_current()
+        
+        # Prompt carrying the conversation so far; it keys the reply cache and
+        # seeds SDK sessions that haven't seen the earlier turns
+        if session.prompt_prefix:
+            history_prompt = f"Conversation history:{session.prompt_prefix}\n\nHuman: {content}\n\nRespond to my latest message."
+        else:
+            history_prompt = content
+        
+        # Prepare SDK attachments from file attachments
+        sdk_attachments = [a.sdk_dict for a in attachments]
+        
+        # The skill lookup is cached, so the current config is cheap to rebuild each turn
+        skill_dirs = await workspace_service.get_skill_directories(effective_workspace)
+        
+        cache_key = copilot_service.response_cache_key(
+            session.model, effective_workspace, history_prompt,
+            [a.path for a in attachments],
+            skill_directories=skill_dirs,
+        )
+        cached_reply = copilot_service.get_cached_response(cache_key)
+        
+        if cached_reply is not None:
+            # Identical prompt already answered: replay without the SDK
+            send({"type": "stream", "content": cached_reply})
+            assistant_text = cached_reply
+            # The live SDK session never saw this exchange; the next turn
+            # starts a new one and hands it the whole history instead
+            if ctx.sdk_session is not None:
+                copilot_service.remove_active_session(ctx.session_id)
+                ctx.drop_sdk_session()
+        else:
+            # Hands back the live SDK session while model, workspace and
+            # skills are unchanged, and replaces it otherwise
+            previous = ctx.sdk_session
+            sdk_session = await copilot_service.create_session(
+                model=session.model,
+                workspace=effective_workspace,
+                session_id=ctx.session_id,
+                skill_directories=skill_dirs if skill_dirs else None,
+            )
+            ctx.sdk_session = sdk_session
+            # A reused session already holds the earlier turns, so it only
+            # needs the new message; resending the transcript would compound
+            prompt = content if sdk_session is previous else history_prompt
+            
+            # The SDK may invoke handlers from a reader thread,
+            # so frames are handed back to the loop thread-safely
+            loop = asyncio.get_running_loop()
+            outbox = ctx.outbox
+            turn = TurnState(emit=lambda frame: loop.call_soon_threadsafe(outbox.put_nowait, frame))
+            
+            def handle_event(event):
+                """Handle streaming events from Copilot SDK."""
+                EVENT_HANDLERS.get(event.type, _on_other)(event, turn)
+            
+            # The SDK session is reused across turns, so the handler
+            # must be detached once this turn is done
+            unsubscribe = sdk_session.on(handle_event)
+            
+            # Send message with attachments to SDK
+            message_options = {"prompt": prompt}
+            if sdk_attachments:
+                message_options["attachments"] = sdk_attachments
+            
+            try:
+                # The SDK enforces the wait itself (60 s unless told otherwise)
+                # and raises TimeoutError with its own message
+                await sdk_session.send_and_wait(message_options, timeout=TURN_TIMEOUT)
+            finally:
+                if callable(unsubscribe):
+                    unsubscribe()
+            
+            assistant_text = turn.buf.decode("utf-8")
+            # Tool calls have side effects, so only pure replies are replayable
+            if assistant_text and not turn.used_tools:
+                copilot_service.cache_response(cache_key, assistant_text)
+        
+        # Create assistant message
+        assistant_msg = Message(
+            role="assistant",
+            content=assistant_text,
+        )
+        session.messages.append(assistant_msg)
+        session.token_count += count_tokens(assistant_text)
+        session.prompt_prefix += f"\n\nHuman: {content[:2000]}\n\nAssistant: {assistant_msg.content[:2000]}"
+        # Persist the completed turn right away
+        session._dirty = True
+        await _flush_session(ctx.session_repo, session)
+        
+        send({
+            "type": "complete",
+            "message": assistant_msg.json_dict(),
+        })
+        
+        if len(session.messages) - session.summarized_count > MAX_SESSION_MESSAGES and (ctx.compact_task is None or ctx.compact_task.done()):
+            ctx.compact_task = asyncio.create_task(_compact_history(ctx))
+        
+    except Exception as e:
+        # Don't reuse a session that just failed
+        if ctx.sdk_session is not None:
+            copilot_service.remove_active_session(ctx.session_id)
+            ctx.drop_sdk_session()
+        send({
+            "type": "error",
+            "error": str(e),
+        })
+
+
+def _transcript(messages: List[Message]) -> str:
+    return "".join(f"\n\n{_ROLE_LABELS[m.role]}: {m.content[:2000]}" for m in messages)
+
+
+async def _compact_history(ctx: ChatContext):
+    """Summarize older turns for prompt building so the prefix stays bounded."""
+    session = ctx.session
+    start = session.summarized_count
+    end = len(session.messages) - KEEP_RECENT_MESSAGES
+    if end <= start:
+        return
+    # The previous summary is folded into the new one
+    material = _summary_block(session.history_summary) + _transcript(session.messages[start:end])
+    try:
+        summary = await ctx.copilot_service.summarize(session.model, material)
+    except Exception:
+        return
+    if not summary:
+        return
+    
+    session.history_summary = summary
+    session.summarized_count = end
+    # A turn may have started meanwhile; its user message joins the prefix on completion
+    done = len(session.messages)
+    while done > end and session.messages[done - 1].role == "user":
+        done -= 1
+    session.prompt_prefix = _summary_block(summary) + _transcript(session.messages[end:done])
+    session._dirty = True
+    await _flush_session(ctx.session_repo, session)
+
+
+def _summary_block(summary: str) -> str:
+    return f"\n\nSummary: {summary}" if summary else ""
+
+
+async def _handle_cancel(data: dict, ctx: ChatContext):
+    ctx.copilot_service.remove_active_session(ctx.session_id)
+    ctx.drop_sdk_session()
+    ctx.send({"type": "cancelled"})
+
+
+async def _handle_execute(data: dict, ctx: ChatContext):
+    command = data.get("command", "")
+    # Incremental decoders so multi-byte characters split across chunks survive
+    decoders = {
+        "stdout": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+        "stderr": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+    }
+    frame_types = {"stdout": "exec_output", "stderr": "exec_error"}
+    try:
+        async for stream, chunk in ctx.workspace_service.execute_command(command, ctx.session.workspace):
+            if stream == "exit":
+                ctx.send({"type": "exec_complete", "code": chunk})
+                continue
+            text = decoders[stream].decode(chunk)
+            if text:
+                ctx.send({"type": frame_types[stream], "content": text})
+    except Exception as e:
+        ctx.send({"type": "exec_error", "content": str(e)})
+
+
+# Client message type -> handler; unknown types are ignored
+HANDLERS: Dict[str, Callable[[dict, ChatContext], Awaitable[None]]] = {
+    "set_model": _handle_set_model,
+    "message": _handle_message,
+    "cancel": _handle_cancel,
+    "execute": _handle_execute,
+}
+
+
 @router.websocket("/ws/chat/{session_id}")
 async def websocket_chat(
     websocket: WebSocket, 
@@ -18,181 +426,58 @@ async def websocket_chat(
     file_attachment_repo: FileAttachmentRepository = Depends(get_file_attachment_repo),
     state: GlobalState = Depends(get_global_state)
 ):
-    await websocket.accept()
+    # Clients that don't offer the msgpack subprotocol keep plain JSON frames
+    use_msgpack = MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+    await websocket.accept(subprotocol=MSGPACK_SUBPROTOCOL if use_msgpack else None)
+    
+    # All outgoing frames go through one queue so they stay ordered
+    outbox: asyncio.Queue = asyncio.Queue()
+    writer_task = asyncio.create_task(_drain(outbox, websocket, msgpack_frames=use_msgpack))
     
     # Get or create session
-    session = await session_repo.get(session_id)
-    if not session:
-        # Default workspace and model
-        current_workspace = workspace_service.get_current()
-        current_model = state.current_model
-        
-        session = Session(
-            id=session_id,
-            workspace=current_workspace,
-            model=current_model,
-        )
-        await session_repo.save(session)
+    async with session_repo.lock(session_id):
+        session = await session_repo.get(session_id)
+        if not session:
+            # Default workspace and model
+            current_workspace = workspace_service.get_current()
+            current_model = state.current_model
+            
+            session = Session(
+                id=session_id,
+                workspace=current_workspace,
+                model=current_model,
+            )
+            await session_repo.save(session)
+    
+    flush_task = asyncio.create_task(_periodic_flush(session_repo, session))
+    
+    ctx = ChatContext(
+        session_id=session_id,
+        session=session,
+        session_repo=session_repo,
+        copilot_service=copilot_service,
+        workspace_service=workspace_service,
+        file_attachment_repo=file_attachment_repo,
+        outbox=outbox,
+    )
     
     try:
         while True:
-            data = await websocket.receive_json()
-            msg_type = data.get("type")
-            
-            if msg_type == "set_model":
-                session.model = data.get("model", session.model)
-                await session_repo.save(session)
-                await websocket.send_json({"type": "model_set", "model": session.model})
-            
-            elif msg_type == "message":
-                content = data.get("content", "")
-                attachment_ids = data.get("attachment_ids", [])
-                
-                # Retrieve file attachments from repository
-                attachments = []
-                if attachment_ids:
-                    for file_id in attachment_ids:
-                        attachment = await file_attachment_repo.get(file_id)
-                        if attachment:
-                            attachments.append(attachment)
-                
-                # Create user message with attachments
-                user_msg = Message(role="user", content=content, attachments=attachments)
-                session.messages.append(user_msg)
-                
-                # Update session name if first message
-                if len(session.messages) == 1:
-                    session.name = content[:50] + ("..." if len(content) > 50 else "")
-                
-                await session_repo.save(session)
-                
-                await websocket.send_json({
-                    "type": "user_message",
-                    "message": user_msg.model_dump(mode="json"),
-                })
-                
-                # Create Copilot SDK session
-                try:
-                    # Use session workspace, fallback to current workspace if empty
-                    effective_workspace = session.workspace or workspace_service.get_current()
-                    
-                    # Get skill directories for the effective workspace
-                    skill_dirs = await workspace_service.get_skill_directories(effective_workspace)
-                    
-                    sdk_session = await copilot_service.create_session(
-                        model=session.model,
-                        workspace=effective_workspace,
-                        session_id=session_id,
-                        skill_directories=skill_dirs if skill_dirs else None
-                    )
-                    
-                    assistant_content = []
-                    
-                    def handle_event(event):
-                        """Handle streaming events from Copilot SDK."""
-                        nonlocal assistant_content
-                        
-                        if event.type == SessionEventType.ASSISTANT_MESSAGE_DELTA:
-                            delta = event.data.delta_content or ""
-                            assistant_content.append(delta)
-                            asyncio.create_task(websocket.send_json({
-                                "type": "stream",
-                                "content": delta,
-                            }))
-                        
-                        elif event.type == SessionEventType.TOOL_EXECUTION_START:
-                            tool_name = event.data.tool_name or "unknown"
-                            args = event.data.arguments
-                            
-                            # Append tool start log to content for persistence
-                            # Using blockquotes for UI container styling
-                            log_entry = f"\n\n> 🔧 **Tool Call:** `{tool_name}`\n> \n> Arguments:\n> ```json\n> {args}\n> ```\n\n"
-                            assistant_content.append(log_entry)
-                            
-                            asyncio.create_task(websocket.send_json({
-                                "type": "tool_start",
-                                "tool": tool_name,
-                                "arguments": args,
-                            }))
-                        
-                        elif event.type == SessionEventType.TOOL_EXECUTION_COMPLETE:
-                            tool_name = event.data.tool_name or "unknown"
-                            result = event.data.result
-                            
-                            # Append tool complete log
-                            log_entry = f"\n\n> ✅ **Tool Result:** `{tool_name}`\n\n"
-                            assistant_content.append(log_entry)
-                            
-                            asyncio.create_task(websocket.send_json({
-                                "type": "tool_complete",
-                                "tool": tool_name,
-                                "result": result.content if result else None,
-                            }))
-                    
-                    sdk_session.on(handle_event)
-                    
-                    # Build prompt with conversation history
-                    history = session.messages[:-1]  # Exclude current message
-                    if history:
-                        history_text = "\n\n".join([
-                            f"{'Human' if m.role == 'user' else 'Assistant'}: {m.content[:2000]}"
-                            for m in history
-                        ])
-                        full_prompt = f"Conversation history:\n\n{history_text}\n\nHuman: {content}\n\nRespond to my latest message."
-                    else:
-                        full_prompt = content
-                    
-                    # Prepare SDK attachments from file attachments
-                    sdk_attachments = []
-                    if attachments:
-                        for attachment in attachments:
-                            sdk_attachments.append({
-                                "type": "file",
-                                "path": attachment.path,
-                                "displayName": attachment.original_filename
-                            })
-                    
-                    # Send message with attachments to SDK
-                    message_options = {"prompt": full_prompt}
-                    if sdk_attachments:
-                        message_options["attachments"] = sdk_attachments
-                    
-                    await sdk_session.send_and_wait(message_options)
-                    
-                    # Create assistant message
-                    assistant_msg = Message(
-                        role="assistant",
-                        content="".join(assistant_content),
-                    )
-                    session.messages.append(assistant_msg)
-                    await session_repo.save(session)
-                    
-                    await websocket.send_json({
-                        "type": "complete",
-                        "message": assistant_msg.model_dump(mode="json"),
-                    })
-                    
-                except Exception as e:
-                    await websocket.send_json({
-                        "type": "error",
-                        "error": str(e),
-                    })
-            
-            elif msg_type == "cancel":
-                copilot_service.remove_active_session(session_id)
-                await websocket.send_json({"type": "cancelled"})
-            
-            elif msg_type == "execute":
-                command = data.get("command", "")
-                try:
-                    result = await workspace_service.execute_command(command, session.workspace)
-                    if result["stdout"]:
-                        await websocket.send_json({"type": "exec_output", "content": result["stdout"]})
-                    if result["stderr"]:
-                        await websocket.send_json({"type": "exec_error", "content": result["stderr"]})
-                    await websocket.send_json({"type": "exec_complete", "code": result["returncode"]})
-                except Exception as e:
-                    await websocket.send_json({"type": "exec_error", "content": str(e)})
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            data = _decode_frame(message, use_msgpack)
+            handler = HANDLERS.get(data.get("type"))
+            if handler:
+                await handler(data, ctx)
     
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Any exit, not just a clean disconnect, must release the SDK session
+        if ctx.compact_task:
+            ctx.compact_task.cancel()
+        writer_task.cancel()
+        flush_task.cancel()
+        await _flush_session(session_repo, session)
         copilot_service.remove_active_session(session_id)
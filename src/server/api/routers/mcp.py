@@ -1,5 +1,5 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from domain.interfaces import MCPService
 from domain.models import MCPServer, MCPServerCreate
 from api.deps import get_mcp_service
@@ -10,7 +10,8 @@ router = APIRouter()
 async def get_mcp_servers(
     service: MCPService = Depends(get_mcp_service)
 ):
-    return await service.list()
+    # Pre-encoded by the service and only rebuilt after a write
+    return Response(content=await service.list_json(), media_type="application/json")
 
 @router.post("/api/mcp/servers", response_model=MCPServer)
 async def create_mcp_server(
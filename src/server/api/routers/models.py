@@ -1,17 +1,27 @@
+from typing import List
 from fastapi import APIRouter, Depends, HTTPException
+from pydantic import TypeAdapter
 from domain.interfaces import CopilotService
-from domain.models import ModelsResponse
+from domain.models import ModelInfo, ModelsResponse
 from api.deps import get_copilot_service, get_global_state, GlobalState
+from api.responses import FastJSONResponse
 
 router = APIRouter()
 
+# Built once at import instead of per request
+_MODEL_INFO_LIST = TypeAdapter(List[ModelInfo])
+
 @router.get("/api/models", response_model=ModelsResponse)
 async def get_models(
     service: CopilotService = Depends(get_copilot_service),
     state: GlobalState = Depends(get_global_state)
 ):
     models = await service.list_models()
-    return ModelsResponse(models=models, current=state.current_model)
+    # ModelInfo instances are already validated; encode them straight with orjson
+    return FastJSONResponse({
+        "models": _MODEL_INFO_LIST.dump_python(models, mode="json"),
+        "current": state.current_model,
+    })
 
 @router.post("/api/models")
 async def set_model(
@@ -1,17 +1,19 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException
-from domain.interfaces import SessionRepository, PlanRepository
+from fastapi import APIRouter, Depends, HTTPException, Response
+from domain.interfaces import SessionRepository, PlanRepository, CopilotService
 from domain.models import (
     Session, SessionCreate, SessionInfo, Plan, PlanCreate
 )
-from api.deps import get_session_repo, get_plan_repo
+from api.deps import get_session_repo, get_plan_repo, get_copilot_service
+from api.responses import FastJSONResponse
 
 router = APIRouter()
 
 # Sessions
 @router.get("/api/sessions", response_model=List[SessionInfo])
 async def get_sessions(repo: SessionRepository = Depends(get_session_repo)):
-    return await repo.list()
+    # Pre-encoded by the repository and only rebuilt after a write
+    return Response(content=await repo.list_json(), media_type="application/json")
 
 @router.post("/api/sessions", response_model=Session)
 async def create_session(data: SessionCreate, repo: SessionRepository = Depends(get_session_repo)):
@@ -22,11 +24,23 @@ async def get_session(session_id: str, repo: SessionRepository = Depends(get_ses
     session = await repo.get(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    return session
+    # Reuse each message's cached dump instead of re-serializing the history
+    body = session.model_dump(mode="json", exclude={"messages"})
+    body["messages"] = [m.json_dict() for m in session.messages]
+    return FastJSONResponse(body)
 
 @router.delete("/api/sessions/{session_id}")
-async def delete_session(session_id: str, repo: SessionRepository = Depends(get_session_repo)):
-    await repo.delete(session_id)
+async def delete_session(
+    session_id: str,
+    repo: SessionRepository = Depends(get_session_repo),
+    copilot_service: CopilotService = Depends(get_copilot_service),
+):
+    # Waits out an in-progress save so it can't re-add the session afterwards
+    async with repo.lock(session_id):
+        await repo.delete(session_id)
+    # A chat socket still open on it recreates its SDK session on the next
+    # turn; one may be mid-turn, so the client is stopped rather than pooled
+    copilot_service.remove_active_session(session_id, reuse_client=False)
     return {"success": True}
 
 @router.get("/api/session/{session_id}/info")
@@ -46,12 +60,13 @@ async def get_session_info(session_id: str, repo: SessionRepository = Depends(ge
 
 @router.patch("/api/session/{session_id}")
 async def update_session(session_id: str, data: dict, repo: SessionRepository = Depends(get_session_repo)):
-    s = await repo.get(session_id)
-    if not s:
-        raise HTTPException(status_code=404, detail="Session not found")
-    if "name" in data:
-        s.name = data["name"]
-        await repo.save(s)
+    async with repo.lock(session_id):
+        s = await repo.get(session_id)
+        if not s:
+            raise HTTPException(status_code=404, detail="Session not found")
+        if "name" in data:
+            s.name = data["name"]
+            await repo.save(s)
     return s
 
 # Plans
@@ -82,8 +97,7 @@ async def get_context(sessionId: Optional[str] = None, repo: SessionRepository =
     if sessionId:
         s = await repo.get(sessionId)
         if s:
-            for msg in s.messages:
-                message_tokens += len(msg.content) // 4
+            message_tokens = s.token_count
     
     return {
         "totalTokens": message_tokens + 3500,
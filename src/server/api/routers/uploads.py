@@ -1,11 +1,12 @@
+import asyncio
 import os
-import uuid
+import shutil
 import mimetypes
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from fastapi.responses import FileResponse
 from domain.interfaces import FileAttachmentRepository
-from domain.models import FileAttachment
+from domain.models import FileAttachment, new_id
 from api.deps import get_file_attachment_repo
 
 router = APIRouter()
@@ -13,6 +14,24 @@ router = APIRouter()
 # Base directory for uploads
 UPLOAD_BASE_DIR = "/tmp/uploads"
 
+# Uploads are copied to disk in chunks of this many bytes
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Downloads are streamed back in chunks of this many bytes
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# Load the MIME tables now rather than on the first upload
+mimetypes.init()
+
+
+def _write_upload(src, file_path: str) -> int:
+    """Copy an upload's spooled file to disk; runs on a worker thread."""
+    src.seek(0)
+    with open(file_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, UPLOAD_CHUNK_SIZE)
+        return dst.tell()
+
+
 @router.post("/api/uploads", response_model=FileAttachment)
 async def upload_file(
     file: UploadFile = File(...),
@@ -22,21 +41,19 @@ async def upload_file(
     """Upload a file for a session."""
     # Create session directory if it doesn't exist
     session_dir = os.path.join(UPLOAD_BASE_DIR, session_id)
+    # Not remembered between uploads: a tmp cleaner may remove it at any time
     os.makedirs(session_dir, exist_ok=True)
     
     # Generate unique filename to avoid conflicts
-    file_id = str(uuid.uuid4())
+    file_id = new_id()
     file_ext = os.path.splitext(file.filename)[1] if file.filename else ""
     unique_filename = f"{file_id}{file_ext}"
     file_path = os.path.join(session_dir, unique_filename)
     
     # Save the file
     try:
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        file_size = len(content)
+        # Copy chunk by chunk in a single worker-thread hop for the whole file
+        file_size = await asyncio.to_thread(_write_upload, file.file, file_path)
         
         # Determine MIME type
         mime_type = file.content_type or mimetypes.guess_type(file.filename)[0] or "application/octet-stream"
@@ -72,14 +89,21 @@ async def download_file(
     if not attachment:
         raise HTTPException(status_code=404, detail="File not found")
     
-    if not os.path.exists(attachment.path):
+    # One stat serves both the existence check and the response headers
+    try:
+        stat_result = os.stat(attachment.path)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found on disk")
     
-    return FileResponse(
+    response = FileResponse(
         path=attachment.path,
         filename=attachment.original_filename,
-        media_type=attachment.mime_type
+        media_type=attachment.mime_type,
+        stat_result=stat_result,
     )
+    # Fewer, larger reads for big files than Starlette's 64 KiB default
+    response.chunk_size = DOWNLOAD_CHUNK_SIZE
+    return response
 
 @router.delete("/api/uploads/{file_id}")
 async def delete_file(
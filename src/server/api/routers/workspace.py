@@ -1,11 +1,14 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException
+from typing import AsyncIterator, List, Optional
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form
+from fastapi.responses import FileResponse, StreamingResponse
 from domain.interfaces import WorkspaceService
 from domain.models import (
-    WorkspaceResponse, WorkspaceUpdate, WorkspaceCreate,
+    WorkspaceResponse, WorkspaceUpdate, WorkspaceCreate, WorkspaceCreateWithInstructions,
     FileEntry, InstructionsResponse, InstructionsUpdate, ReviewResponse
 )
 from api.deps import get_workspace_service
+from api.responses import FastJSONResponse
 
 router = APIRouter()
 
@@ -29,6 +32,18 @@ async def create_workspace(data: WorkspaceCreate, service: WorkspaceService = De
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/api/workspaces/create_and_fetch_instructions", response_model=WorkspaceCreateWithInstructions)
+async def create_workspace_with_instructions(data: WorkspaceCreate, service: WorkspaceService = Depends(get_workspace_service)):
+    # Creation and the follow-up instructions read in one round trip
+    try:
+        info = await service.create(data.name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    # Read from the created workspace, not whichever one is current by now
+    return WorkspaceCreateWithInstructions(workspace=info, instructions=await service.get_instructions(info.workspace))
+
 @router.get("/api/workspace/instructions", response_model=InstructionsResponse)
 async def get_instructions(service: WorkspaceService = Depends(get_workspace_service)):
     return await service.get_instructions()
@@ -38,14 +53,37 @@ async def save_instructions(data: InstructionsUpdate, service: WorkspaceService
     return await service.save_instructions(data.content)
 
 @router.get("/api/files", response_model=List[FileEntry])
-async def get_files(path: Optional[str] = None, service: WorkspaceService = Depends(get_workspace_service)):
+async def get_files(request: Request, path: Optional[str] = None, service: WorkspaceService = Depends(get_workspace_service)):
+    # Clients asking for NDJSON get rows as the directory is read, one entry per line
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        batches = service.iter_files(path)
+        try:
+            first = await anext(batches, [])
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        return StreamingResponse(_ndjson_rows(first, batches), media_type="application/x-ndjson")
     try:
         return await service.list_files(path)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+async def _ndjson_rows(first: List[FileEntry], rest: AsyncIterator[List[FileEntry]]):
+    batch = first
+    while batch:
+        yield b"".join(orjson.dumps(e.model_dump()) + b"\n" for e in batch)
+        batch = await anext(rest, [])
+
 @router.get("/api/file")
-async def get_file(path: str, service: WorkspaceService = Depends(get_workspace_service)):
+async def get_file(path: str, raw: bool = False, service: WorkspaceService = Depends(get_workspace_service)):
+    # Raw reads go straight from disk to the socket, no decode or JSON escaping
+    if raw:
+        try:
+            stat_result = await service.stat_file(path)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="File not found")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        return FileResponse(path, media_type="text/plain; charset=utf-8", stat_result=stat_result)
     try:
         content = await service.read_file(path)
         return {"content": content, "path": path}
@@ -62,6 +100,17 @@ async def write_file(data: dict, service: WorkspaceService = Depends(get_workspa
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/api/file/raw")
+async def write_file_raw(path: str = Form(...), file: UploadFile = File(...), service: WorkspaceService = Depends(get_workspace_service)):
+    # The body is spooled by the multipart parser and copied in chunks, never held whole
+    try:
+        size = await service.write_file_from(path, file.file)
+        return {"success": True, "size": size}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/api/review", response_model=ReviewResponse)
 async def code_review(data: dict, service: WorkspaceService = Depends(get_workspace_service)):
-    return await service.run_review(data.get("workspace"))
+    review = await service.run_review(data.get("workspace"))
+    # Built by the service already; skip response_model revalidation of every result
+    return FastJSONResponse(review.model_dump(mode="json"))
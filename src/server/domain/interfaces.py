@@ -1,5 +1,6 @@
+import os
 from abc import ABC, abstractmethod
-from typing import List, Optional, AsyncIterator, Dict, Any
+from typing import List, Optional, AsyncContextManager, AsyncIterator, BinaryIO, Dict, Any, Tuple
 from .models import (
     Session, SessionCreate, SessionInfo,
     ModelInfo, Skill, MCPServer, MCPServerCreate,
@@ -21,8 +22,14 @@ class SessionRepository(ABC):
     @abstractmethod
     async def list(self) -> List[SessionInfo]: ...
     
+    @abstractmethod
+    async def list_json(self) -> bytes: ...
+    
     @abstractmethod
     async def create(self, data: SessionCreate) -> Session: ...
+    
+    @abstractmethod
+    def lock(self, session_id: str) -> AsyncContextManager[None]: ...
 
 class PlanRepository(ABC):
     @abstractmethod
@@ -45,7 +52,7 @@ class WorkspaceService(ABC):
     async def set_current(self, path: str) -> WorkspaceResponse: ...
     
     @abstractmethod
-    async def get_info(self) -> WorkspaceResponse: ...
+    async def get_info(self, workspace: Optional[str] = None) -> WorkspaceResponse: ...
     
     @abstractmethod
     async def create(self, name: str) -> WorkspaceResponse: ...
@@ -53,14 +60,26 @@ class WorkspaceService(ABC):
     @abstractmethod
     async def list_files(self, path: Optional[str] = None) -> List[FileEntry]: ...
     
+    @abstractmethod
+    async def list_files_cached(self, path: Optional[str] = None) -> Tuple[List[FileEntry], float]: ...
+    
+    @abstractmethod
+    def iter_files(self, path: Optional[str] = None) -> AsyncIterator[List[FileEntry]]: ...
+    
     @abstractmethod
     async def read_file(self, path: str) -> str: ...
     
+    @abstractmethod
+    async def stat_file(self, path: str) -> os.stat_result: ...
+    
     @abstractmethod
     async def write_file(self, path: str, content: str) -> bool: ...
     
     @abstractmethod
-    async def get_instructions(self) -> InstructionsResponse: ...
+    async def write_file_from(self, path: str, src: BinaryIO) -> int: ...
+    
+    @abstractmethod
+    async def get_instructions(self, workspace: Optional[str] = None) -> InstructionsResponse: ...
     
     @abstractmethod
     async def save_instructions(self, content: str) -> InstructionsResponse: ...
@@ -84,7 +103,10 @@ class WorkspaceService(ABC):
     async def run_review(self, workspace: Optional[str] = None) -> ReviewResponse: ...
 
     @abstractmethod
-    async def execute_command(self, command: str, cwd: Optional[str] = None) -> Any: ...
+    def execute_command(self, command: str, cwd: Optional[str] = None) -> AsyncIterator[Tuple[str, Any]]: ...
+
+    @abstractmethod
+    async def stop(self): ...
 
 class SettingsService(ABC):
     @abstractmethod
@@ -97,6 +119,9 @@ class MCPService(ABC):
     @abstractmethod
     async def list(self) -> List[MCPServer]: ...
     
+    @abstractmethod
+    async def list_json(self) -> bytes: ...
+    
     @abstractmethod
     async def create(self, data: MCPServerCreate) -> MCPServer: ...
     
@@ -105,6 +130,9 @@ class MCPService(ABC):
     
     @abstractmethod
     async def delete(self, server_id: str) -> bool: ...
+    
+    @abstractmethod
+    async def get_mcp_config(self) -> Dict[str, Any]: ...
 
 class CopilotService(ABC):
     @abstractmethod
@@ -117,7 +145,19 @@ class CopilotService(ABC):
     async def list_models(self) -> List[ModelInfo]: ...
     
     @abstractmethod
-    async def create_session(self, model: str, workspace: str, session_id: Optional[str] = None, skill_directories: Optional[List[str]] = None) -> Any: ...
+    async def create_session(self, model: str, workspace: str, session_id: Optional[str] = None, skill_directories: Optional[List[str]] = None, mcp_servers: Optional[Dict[str, Any]] = None) -> Any: ...
+    
+    @abstractmethod
+    def response_cache_key(self, model: str, workspace: str, prompt: str, attachment_paths: List[str], skill_directories: Optional[List[str]] = None, mcp_servers: Optional[Dict[str, Any]] = None) -> bytes: ...
+    
+    @abstractmethod
+    def get_cached_response(self, key: bytes) -> Optional[str]: ...
+    
+    @abstractmethod
+    def cache_response(self, key: bytes, response: str): ...
+    
+    @abstractmethod
+    async def summarize(self, model: str, transcript: str) -> str: ...
 
 class FileAttachmentRepository(ABC):
     @abstractmethod
@@ -126,6 +166,9 @@ class FileAttachmentRepository(ABC):
     @abstractmethod
     async def get(self, file_id: str) -> Optional[FileAttachment]: ...
     
+    @abstractmethod
+    async def get_many(self, file_ids: List[str]) -> List[FileAttachment]: ...
+    
     @abstractmethod
     async def delete(self, file_id: str) -> bool: ...
     
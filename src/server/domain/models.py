@@ -3,14 +3,36 @@ Pydantic models for the Copilot SDK UI Python server.
 """
 
 from datetime import datetime
+from functools import cached_property
 from typing import Optional, Literal
-from pydantic import BaseModel, Field
-import uuid
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
+import os
+
+# Ids handed out per os.urandom call
+_ID_BATCH = 128
+_id_pool: list[str] = []
+
+
+def _fill_id_pool():
+    raw = bytearray(os.urandom(16 * _ID_BATCH))
+    for i in range(0, len(raw), 16):
+        # Set the version 4 and RFC 4122 variant bits, as uuid4() would
+        raw[i + 6] = (raw[i + 6] & 0x0F) | 0x40
+        raw[i + 8] = (raw[i + 8] & 0x3F) | 0x80
+        h = raw[i:i + 16].hex()
+        _id_pool.append(f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}")
+
+
+def new_id() -> str:
+    """Random UUID4 string, drawn from a pool filled by one urandom read."""
+    if not _id_pool:
+        _fill_id_pool()
+    return _id_pool.pop()
 
 
 class FileAttachment(BaseModel):
     """A file attachment."""
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     session_id: str
     filename: str
     original_filename: str
@@ -19,25 +41,48 @@ class FileAttachment(BaseModel):
     mime_type: str
     created_at: datetime = Field(default_factory=datetime.now)
 
+    @cached_property
+    def sdk_dict(self) -> dict:
+        """Attachment entry in the shape the Copilot SDK expects."""
+        return {"type": "file", "path": self.path, "displayName": self.original_filename}
+
 
 class Message(BaseModel):
     """A chat message."""
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     role: Literal["user", "assistant", "system"]
     content: str
     timestamp: datetime = Field(default_factory=datetime.now)
     attachments: list[FileAttachment] = Field(default_factory=list)
+    # JSON-mode dump, filled on first use; messages aren't edited once created
+    _json: Optional[dict] = PrivateAttr(default=None)
+
+    def json_dict(self) -> dict:
+        """Cached ``model_dump(mode="json")`` for wire frames and session fetches."""
+        if self._json is None:
+            self._json = self.model_dump(mode="json")
+        return self._json
 
 
 class Session(BaseModel):
     """A chat session."""
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     name: str = "New Chat"
     messages: list[Message] = Field(default_factory=list)
     workspace: str = ""
     created_at: datetime = Field(default_factory=datetime.now)
     copilot_session_id: Optional[str] = None
     model: str = "claude-sonnet-4"
+    # Rolling "Human/Assistant" transcript, appended once per completed turn;
+    # internal to prompt building, so it is kept out of API responses
+    prompt_prefix: str = Field(default="", exclude=True)
+    # Summary of messages[:summarized_count], standing in for them in prompt_prefix
+    history_summary: str = Field(default="", exclude=True)
+    summarized_count: int = Field(default=0, exclude=True)
+    # Tokens across messages, kept in step with appends so context checks stay O(1)
+    token_count: int = Field(default=0, exclude=True)
+    # Set when the session changed since it was last saved to its repository
+    _dirty: bool = PrivateAttr(default=False)
 
 
 class SessionCreate(BaseModel):
@@ -49,6 +94,9 @@ class SessionCreate(BaseModel):
 
 class SessionInfo(BaseModel):
     """Summary info for a session."""
+    # Immutable so the repository's listing rows can be handed out as-is
+    model_config = ConfigDict(frozen=True)
+
     id: str
     name: str
     workspace: str
@@ -59,6 +107,9 @@ class SessionInfo(BaseModel):
 
 class ModelInfo(BaseModel):
     """Information about an AI model."""
+    # Immutable so cached model lists can be shared between callers
+    model_config = ConfigDict(frozen=True)
+
     id: str
     name: str
     provider: str
@@ -79,7 +130,7 @@ class Skill(BaseModel):
 
 class MCPServer(BaseModel):
     """An MCP server configuration."""
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     name: str
     command: str
     args: list[str] = Field(default_factory=list)
@@ -115,7 +166,7 @@ class AppSettings(BaseModel):
 
 class Plan(BaseModel):
     """A plan for a session."""
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
     title: str = "Untitled Plan"
     content: str = ""
     status: Literal["draft", "active", "completed"] = "draft"
@@ -156,6 +207,12 @@ class InstructionsUpdate(BaseModel):
     content: str
 
 
+class WorkspaceCreateWithInstructions(BaseModel):
+    """Response for creating a workspace and reading its instructions in one call."""
+    workspace: WorkspaceResponse
+    instructions: InstructionsResponse
+
+
 class FileEntry(BaseModel):
     """A file or directory entry."""
     name: str
@@ -0,0 +1,35 @@
+"""
+Token counting for context-usage estimates.
+"""
+
+from typing import Any
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to the ~4 characters per token rule
+    tiktoken = None
+
+# Set by load_encoding(); until then, or if loading fails, counts are estimates
+_encoding: Any = None
+
+
+def load_encoding():
+    """Load the cl100k_base encoding once.
+
+    Blocking, and may download the BPE file on first use, so the server
+    calls it on a worker thread at startup rather than from a request.
+    """
+    global _encoding
+    if _encoding is not None or tiktoken is None:
+        return
+    try:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        pass  # E.g. offline without cached encoding data; keep estimating
+
+
+def count_tokens(text: str) -> int:
+    """Token count of text with cl100k_base once loaded, else len // 4."""
+    if _encoding is not None:
+        return len(_encoding.encode_ordinary(text))
+    return len(text) // 4
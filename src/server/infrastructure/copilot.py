@@ -1,80 +1,174 @@
-from typing import List, Any, Optional, Dict
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import List, Any, Optional, Dict, Tuple
+import orjson
 from copilot import CopilotClient
 from domain.interfaces import CopilotService
 from domain.models import ModelInfo
 
+# Maximum number of replayable responses kept in memory
+RESPONSE_CACHE_SIZE = 1024
+
+# Live SDK sessions kept before the least recently used one is shut down;
+# each holds its own CLI client process
+MAX_ACTIVE_SESSIONS = 128
+
+# Started clients kept per working directory once their session is retired,
+# so the next session there skips the CLI startup
+MAX_IDLE_CLIENTS_PER_CWD = 2
+
+# Seconds a pooled client may sit idle before it is stopped
+CLIENT_IDLE_TIMEOUT = 300
+
+# Seconds a fetched model list is served from memory
+MODELS_CACHE_TTL = 300
+
+# Model id prefixes and the provider they belong to, checked in order
+_PROVIDER_PREFIXES = (
+    ("claude", "Anthropic"),
+    ("gpt", "OpenAI"),
+    ("o1", "OpenAI"),
+    ("o3", "OpenAI"),
+    ("o4", "OpenAI"),
+    ("gemini", "Google"),
+)
+
+# Served when the SDK can't list models
+_FALLBACK_MODELS = (
+    ModelInfo(id="claude-sonnet-4", name="Claude Sonnet 4", provider="Anthropic"),
+    ModelInfo(id="claude-sonnet-4.5", name="Claude Sonnet 4.5", provider="Anthropic"),
+    ModelInfo(id="gpt-4.1", name="GPT-4.1", provider="OpenAI"),
+    ModelInfo(id="gpt-5", name="GPT-5", provider="OpenAI"),
+    ModelInfo(id="gemini-3-pro-preview", name="Gemini 3 Pro Preview", provider="Google"),
+)
+
+# Instruction prepended to a transcript when compacting chat history
+SUMMARY_PROMPT = (
+    "Summarize the following conversation in a few short paragraphs. "
+    "Keep facts, decisions, file names and open questions; drop pleasantries.\n\n"
+)
+
 class CopilotClientService(CopilotService):
     def __init__(self):
         self.client = None
-        self.active_sessions = {}
-        self.session_clients: Dict[str, CopilotClient] = {}
+        self.active_sessions: "OrderedDict[str, Any]" = OrderedDict()
+        # Client serving each active session, with the cwd it was started in
+        self.session_clients: Dict[str, Tuple[str, CopilotClient]] = {}
+        # Idle started clients per cwd, with the time they were released
+        self.idle_clients: Dict[str, List[Tuple[float, CopilotClient]]] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        # Fire-and-forget cleanups, referenced so they aren't collected mid-flight
+        self._bg_tasks: set[asyncio.Task] = set()
+        # (fetched_at, models) from the last successful list_models call
+        self._models_cache: Optional[Tuple[float, List[ModelInfo]]] = None
+        # Fetch in progress, shared by every caller that arrives meanwhile
+        self._models_inflight: Optional[asyncio.Task] = None
+        # Config each active session was created with, used to decide reuse
+        self.session_configs: Dict[str, tuple] = {}
+        # LRU of full responses keyed by a digest of everything that shaped them
+        self.response_cache: "OrderedDict[bytes, str]" = OrderedDict()
 
     async def start(self):
         # Create a default client for listing models
         self.client = CopilotClient()
         await self.client.start()
+        self._reaper = asyncio.create_task(self._reap_idle())
 
     async def stop(self):
-        # Stop all session-specific clients
-        for client in self.session_clients.values():
-            try:
-                await client.stop()
-            except Exception:
-                pass
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        
+        # Let pending releases finish so their clients are stopped below
+        if self._bg_tasks:
+            await asyncio.gather(*self._bg_tasks, return_exceptions=True)
+        
+        # Destroy live sessions, then stop all session-specific and pooled
+        # clients; each step fans out so shutdown waits for the slowest only
+        await asyncio.gather(*(self._safe_destroy(session) for session in self.active_sessions.values()))
+        self.active_sessions.clear()
+        self.session_configs.clear()
+        
+        clients = [client for _, client in self.session_clients.values()]
+        clients += [client for idle in self.idle_clients.values() for _, client in idle]
+        await asyncio.gather(*(self._stop_client(client) for client in clients))
         self.session_clients.clear()
+        self.idle_clients.clear()
         
         if self.client:
             await self.client.stop()
+            self.client = None
+        self._models_cache = None
 
     async def list_models(self) -> List[ModelInfo]:
         if not self.client:
             return []
-            
-        def resolve_provider(model_id: str, model_name: str) -> str:
-            text = f"{model_id} {model_name}".lower()
-            if "claude" in text:
-                return "Anthropic"
-            if "gpt" in text or "openai" in text:
-                return "OpenAI"
-            if "gemini" in text or "google" in text:
-                return "Google"
+        
+        cached = self._models_cache
+        if cached is not None and time.monotonic() - cached[0] < MODELS_CACHE_TTL:
+            return list(cached[1])
+        
+        # Single flight: concurrent callers share one SDK round-trip, fallback included
+        if self._models_inflight is None:
+            self._models_inflight = asyncio.create_task(self._fetch_models())
+            self._models_inflight.add_done_callback(self._clear_models_inflight)
+        # Shielded so one caller going away doesn't cancel the shared fetch
+        return list(await asyncio.shield(self._models_inflight))
+    
+    def _clear_models_inflight(self, task: asyncio.Task):
+        if self._models_inflight is task:
+            self._models_inflight = None
+    
+    async def _fetch_models(self) -> List[ModelInfo]:
+        def resolve_provider(model_id: str) -> str:
+            lid = model_id.lower()
+            for prefix, provider in _PROVIDER_PREFIXES:
+                if lid.startswith(prefix):
+                    return provider
             return "Unknown"
 
         try:
             sdk_models = await self.client.list_models()
-            return [
+            models = [
                 ModelInfo(
                     id=m.get("id", m),
                     name=m.get("name", m),
-                    provider=m.get("provider") or resolve_provider(m.get("id", ""), m.get("name", "")),
+                    provider=m.get("provider") or resolve_provider(m.get("id", "")),
                 )
                 for m in sdk_models
             ] if sdk_models else []
+            self._models_cache = (time.monotonic(), models)
+            return list(models)
         except Exception:
-            # Fallback
-            return [
-                ModelInfo(id="claude-sonnet-4", name="Claude Sonnet 4", provider="Anthropic"),
-                ModelInfo(id="claude-sonnet-4.5", name="Claude Sonnet 4.5", provider="Anthropic"),
-                ModelInfo(id="gpt-4.1", name="GPT-4.1", provider="OpenAI"),
-                ModelInfo(id="gpt-5", name="GPT-5", provider="OpenAI"),
-                ModelInfo(id="gemini-3-pro-preview", name="Gemini 3 Pro Preview", provider="Google"),
-            ]
-
-    async def create_session(self, model: str, workspace: str, session_id: Optional[str] = None, skill_directories: Optional[List[str]] = None) -> Any:
+            # Fallback, not cached so the next call retries the SDK
+            return list(_FALLBACK_MODELS)
+
+    async def create_session(self, model: str, workspace: str, session_id: Optional[str] = None, skill_directories: Optional[List[str]] = None, mcp_servers: Optional[Dict[str, Any]] = None) -> Any:
         if not self.client:
             raise RuntimeError("Copilot client not initialized")
         
         # Use workspace or fallback to current directory
-        import os
         effective_cwd = workspace if workspace else os.getcwd()
         
-        # Create a session-specific client with the correct working directory
-        session_client = CopilotClient({"cwd": effective_cwd})
-        await session_client.start()
+        # Reuse the live session if nothing that shapes it has changed
+        config_key = (model, effective_cwd, tuple(skill_directories or ()), self._mcp_digest(mcp_servers))
+        if session_id:
+            existing = self.active_sessions.get(session_id)
+            if existing is not None and self.session_configs.get(session_id) == config_key:
+                self.active_sessions.move_to_end(session_id)
+                return existing
+            # Config changed: retire the stale session and its client first
+            self.remove_active_session(session_id)
+        
+        # Take a client started in the right working directory, pooled if possible
+        session_client = await self._acquire_client(effective_cwd)
         
         # Store client for later cleanup
         if session_id:
-            self.session_clients[session_id] = session_client
+            self.session_clients[session_id] = (effective_cwd, session_client)
         
         # Build session config
         session_config = {
@@ -86,26 +180,140 @@ class CopilotClientService(CopilotService):
         if skill_directories:
             session_config["skill_directories"] = skill_directories
         
+        # Add enabled MCP servers if any
+        if mcp_servers:
+            session_config["mcp_servers"] = mcp_servers
+        
         session = await session_client.create_session(session_config)
         if session_id:
             self.active_sessions[session_id] = session
+            self.session_configs[session_id] = config_key
+            while len(self.active_sessions) > MAX_ACTIVE_SESSIONS:
+                oldest = next(iter(self.active_sessions))
+                # It may still be mid-turn, so its client can't be handed to another session
+                self.remove_active_session(oldest, reuse_client=False)
         return session
     
+    @staticmethod
+    def _mcp_digest(mcp_servers: Optional[Dict[str, Any]]) -> bytes:
+        """Order-independent fingerprint of an MCP config for the reuse check."""
+        if not mcp_servers:
+            return b""
+        return hashlib.blake2b(orjson.dumps(mcp_servers, option=orjson.OPT_SORT_KEYS), digest_size=8).digest()
+    
     def get_active_session(self, session_id: str) -> Any:
-        return self.active_sessions.get(session_id)
+        session = self.active_sessions.get(session_id)
+        if session is not None:
+            self.active_sessions.move_to_end(session_id)
+        return session
         
-    def remove_active_session(self, session_id: str):
-        if session_id in self.active_sessions:
-            del self.active_sessions[session_id]
-        # Also cleanup the session client
-        if session_id in self.session_clients:
+    def remove_active_session(self, session_id: str, reuse_client: bool = True):
+        session = self.active_sessions.pop(session_id, None)
+        self.session_configs.pop(session_id, None)
+        # Also hand the session client back to the pool, or stop it
+        entry = self.session_clients.pop(session_id, None)
+        if entry is not None:
             # Schedule async cleanup
-            client = self.session_clients.pop(session_id)
-            import asyncio
-            asyncio.create_task(self._stop_client(client))
+            cwd, client = entry
+            if reuse_client:
+                cleanup = self._release_client(cwd, client, session)
+            else:
+                cleanup = self._discard_client(client, session)
+            task = asyncio.create_task(cleanup)
+            self._bg_tasks.add(task)
+            task.add_done_callback(self._bg_tasks.discard)
+    
+    async def _acquire_client(self, cwd: str) -> CopilotClient:
+        idle = self.idle_clients.get(cwd)
+        if idle:
+            _, client = idle.pop()
+            return client
+        client = CopilotClient({"cwd": cwd})
+        await client.start()
+        return client
+    
+    async def _release_client(self, cwd: str, client: CopilotClient, session: Any):
+        # Only a client whose session was torn down cleanly is safe to reuse
+        try:
+            destroy = getattr(session, "destroy", None)
+            if destroy:
+                await destroy()
+        except Exception:
+            await self._stop_client(client)
+            return
+        
+        idle = self.idle_clients.setdefault(cwd, [])
+        if self.client is not None and len(idle) < MAX_IDLE_CLIENTS_PER_CWD:
+            idle.append((time.monotonic(), client))
+        else:
+            await self._stop_client(client)
+    
+    async def _discard_client(self, client: CopilotClient, session: Any):
+        await self._safe_destroy(session)
+        await self._stop_client(client)
+    
+    async def _reap_idle(self):
+        """Stop pooled clients that have been idle for too long."""
+        while True:
+            await asyncio.sleep(CLIENT_IDLE_TIMEOUT / 2)
+            cutoff = time.monotonic() - CLIENT_IDLE_TIMEOUT
+            for cwd, idle in list(self.idle_clients.items()):
+                expired = [client for released, client in idle if released < cutoff]
+                idle[:] = [entry for entry in idle if entry[0] >= cutoff]
+                if not idle:
+                    del self.idle_clients[cwd]
+                for client in expired:
+                    await self._stop_client(client)
+    
+    async def _safe_destroy(self, session: Any):
+        try:
+            destroy = getattr(session, "destroy", None)
+            if destroy:
+                await destroy()
+        except Exception:
+            pass
     
     async def _stop_client(self, client: CopilotClient):
         try:
             await client.stop()
         except Exception:
             pass
+
+    def response_cache_key(self, model: str, workspace: str, prompt: str, attachment_paths: List[str], skill_directories: Optional[List[str]] = None, mcp_servers: Optional[Dict[str, Any]] = None) -> bytes:
+        material = "|".join([model, workspace, prompt, *attachment_paths])
+        key = hashlib.blake2b(material.encode("utf-8"), digest_size=16)
+        # The session config and the instructions file the CLI reads from its
+        # cwd shape the reply too, so changing either must miss the cache
+        try:
+            instructions = os.stat(os.path.join(workspace or os.getcwd(), ".github", "copilot-instructions.md")).st_mtime_ns
+        except OSError:
+            instructions = None
+        key.update(orjson.dumps([list(skill_directories or ()), instructions]))
+        key.update(self._mcp_digest(mcp_servers))
+        return key.digest()
+
+    def get_cached_response(self, key: bytes) -> Optional[str]:
+        response = self.response_cache.get(key)
+        if response is not None:
+            self.response_cache.move_to_end(key)
+        return response
+
+    def cache_response(self, key: bytes, response: str):
+        self.response_cache[key] = response
+        self.response_cache.move_to_end(key)
+        if len(self.response_cache) > RESPONSE_CACHE_SIZE:
+            self.response_cache.popitem(last=False)
+
+    async def summarize(self, model: str, transcript: str) -> str:
+        """One-shot, non-streaming summary of a transcript on the default client."""
+        if not self.client:
+            raise RuntimeError("Copilot client not initialized")
+        
+        session = await self.client.create_session({"model": model})
+        try:
+            reply = await session.send_and_wait({"prompt": SUMMARY_PROMPT + transcript})
+        finally:
+            destroy = getattr(session, "destroy", None)
+            if destroy:
+                await destroy()
+        return reply.data.content if reply and reply.data.content else ""
@@ -1,38 +1,79 @@
-import uuid
 from typing import List, Dict, Any, Optional
+from pydantic import TypeAdapter
 from domain.interfaces import MCPService
-from domain.models import MCPServer, MCPServerCreate
+from domain.models import MCPServer, MCPServerCreate, new_id
+
+# Fields a PATCH may change on a server
+_MUTABLE_FIELDS = frozenset(("enabled", "name", "command", "args", "env"))
+
+_SERVER_LIST = TypeAdapter(List[MCPServer])
 
 class InMemoryMCPService(MCPService):
     def __init__(self):
         self.servers: Dict[str, MCPServer] = {}
+        # Bumped on every mutation; the built SDK config is cached per version
+        self._version = 0
+        self._cached_cfg: Optional[Dict[str, Any]] = None
+        self._cached_version = -1
+        # Encoded server list for GET /api/mcp/servers, dropped on every mutation
+        self._list_json: Optional[bytes] = None
+
+    def _invalidate(self):
+        self._version += 1
+        self._cached_cfg = None
+        self._list_json = None
 
     async def list(self) -> List[MCPServer]:
         return list(self.servers.values())
 
+    async def list_json(self) -> bytes:
+        if self._list_json is None:
+            self._list_json = _SERVER_LIST.dump_json(list(self.servers.values()))
+        return self._list_json
+
     async def create(self, data: MCPServerCreate) -> MCPServer:
         server = MCPServer(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             name=data.name,
             command=data.command,
             args=data.args or [],
             env=data.env or {},
         )
         self.servers[server.id] = server
+        self._invalidate()
         return server
 
     async def update(self, server_id: str, data: Dict[str, Any]) -> Optional[MCPServer]:
         if server_id not in self.servers:
             return None
         server = self.servers[server_id]
-        for key in ["enabled", "name", "command", "args", "env"]:
-            if key in data:
-                setattr(server, key, data[key])
-        server.status = "running" if server.enabled else "stopped"
+        changed = _MUTABLE_FIELDS & data.keys()
+        if not changed:
+            return server
+        for key in changed:
+            setattr(server, key, data[key])
+        if "enabled" in changed:
+            server.status = "running" if server.enabled else "stopped"
+        self._invalidate()
         return server
 
     async def delete(self, server_id: str) -> bool:
-        if server_id in self.servers:
-            del self.servers[server_id]
-            return True
-        return False
+        if self.servers.pop(server_id, None) is None:
+            return False
+        self._invalidate()
+        return True
+
+    async def get_mcp_config(self) -> Dict[str, Any]:
+        if self._cached_cfg is None or self._cached_version != self._version:
+            self._cached_cfg = {
+                server.name: {
+                    "type": "stdio",
+                    "command": server.command,
+                    "args": server.args,
+                    "env": server.env,
+                }
+                for server in self.servers.values()
+                if server.enabled
+            }
+            self._cached_version = self._version
+        return self._cached_cfg
@@ -1,80 +1,265 @@
-from typing import List, Optional, Dict
-import uuid
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
+import asyncio
 import os
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
 from datetime import datetime
+import orjson
+from pydantic import TypeAdapter
 from domain.interfaces import SessionRepository, PlanRepository, FileAttachmentRepository
-from domain.models import Session, SessionCreate, SessionInfo, Plan, PlanCreate, FileAttachment
+from domain.models import Session, SessionCreate, SessionInfo, Plan, PlanCreate, FileAttachment, new_id
+from domain.tokens import count_tokens, load_encoding
+
+# Append-only session log; unset keeps sessions purely in memory
+SESSION_WAL_PATH = os.environ.get("COPILOT_SESSION_WAL")
+
+# The log is rewritten to one record per live session once it exceeds both
+# WAL_COMPACT_RATIO times the size of those records and WAL_COMPACT_MIN_BYTES
+WAL_COMPACT_RATIO = 4
+WAL_COMPACT_MIN_BYTES = 1 << 20
+
+_SESSION_INFO_LIST = TypeAdapter(List[SessionInfo])
 
 class InMemorySessionRepository(SessionRepository):
-    def __init__(self):
+    def __init__(self, wal_path: Optional[str] = SESSION_WAL_PATH):
         self.sessions: Dict[str, Session] = {}
+        # Listing rows, refreshed whenever a session is written
+        self._info_index: Dict[str, SessionInfo] = {}
+        # Encoded listing, rebuilt on the first read after any write
+        self._list_json: Optional[bytes] = None
+        # Serializes read-modify-save sequences on one session across requests;
+        # each lock is held with a count of its holder and waiters
+        self._locks: Dict[str, Tuple[asyncio.Lock, List[int]]] = {}
+        # Pending log records, written and fsynced in batches by _wal_writer
+        self._wal_path = wal_path
+        self._wal: Optional[asyncio.Queue] = None
+        self._wal_task: Optional[asyncio.Task] = None
+        # Bytes in the log file, and the size of each session's latest record
+        self._wal_bytes = 0
+        self._live_bytes: Dict[str, int] = {}
+        if wal_path:
+            self._replay_wal()
+
+    @staticmethod
+    def _info(s: Session) -> SessionInfo:
+        # Fields come from an already-validated Session, so skip revalidation
+        return SessionInfo.model_construct(
+            id=s.id,
+            name=s.name,
+            workspace=s.workspace,
+            message_count=len(s.messages),
+            created_at=s.created_at,
+            model=s.model,
+        )
+
+    @asynccontextmanager
+    async def lock(self, session_id: str) -> AsyncIterator[None]:
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = (asyncio.Lock(), [0])
+        lock, users = entry
+        users[0] += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            # Dropped only once released with nobody else waiting on it
+            users[0] -= 1
+            if not users[0]:
+                del self._locks[session_id]
 
     async def get(self, session_id: str) -> Optional[Session]:
         return self.sessions.get(session_id)
 
-    async def save(self, session: Session) -> Session:
+    async def save(self, session: Session, durable: bool = False) -> Session:
         self.sessions[session.id] = session
+        self._info_index[session.id] = self._info(session)
+        self._list_json = None
+        await self._log(("save", session), durable)
         return session
 
     async def delete(self, session_id: str) -> bool:
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-            return True
-        return False
+        self._info_index.pop(session_id, None)
+        self._list_json = None
+        if self.sessions.pop(session_id, None) is None:
+            return False
+        await self._log(("delete", session_id))
+        return True
 
     async def list(self) -> List[SessionInfo]:
-        return [
-            SessionInfo(
-                id=s.id,
-                name=s.name,
-                workspace=s.workspace,
-                message_count=len(s.messages),
-                created_at=s.created_at,
-                model=s.model,
-            )
-            for s in self.sessions.values()
-        ]
+        return list(self._info_index.values())
+
+    async def list_json(self) -> bytes:
+        if self._list_json is None:
+            self._list_json = _SESSION_INFO_LIST.dump_json(list(self._info_index.values()))
+        return self._list_json
 
     async def create(self, data: SessionCreate) -> Session:
         session = Session(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             name=data.name or "New Chat",
             workspace=data.workspace or "",
             model=data.model or "claude-sonnet-4", # Default handled in service/usecase usually, but okay here
         )
         self.sessions[session.id] = session
+        self._info_index[session.id] = self._info(session)
+        self._list_json = None
+        await self._log(("save", session))
         return session
 
+    async def flush(self):
+        """Wait until every queued log record is on disk."""
+        if self._wal is not None:
+            await self._wal.join()
+
+    @staticmethod
+    def _record(op: str, target: Any) -> Dict[str, Any]:
+        if op == "delete":
+            return {"op": "delete", "id": target}
+        data = target.model_dump(mode="json")
+        # Excluded from API dumps but needed to resume the conversation
+        data["prompt_prefix"] = target.prompt_prefix
+        data["history_summary"] = target.history_summary
+        data["summarized_count"] = target.summarized_count
+        return {"op": "save", "session": data}
+
+    async def _log(self, entry: Tuple[str, Any], durable: bool = False):
+        if not self._wal_path:
+            return
+        if self._wal is None:
+            self._wal = asyncio.Queue()
+            self._wal_task = asyncio.create_task(self._wal_writer())
+        done = asyncio.get_running_loop().create_future() if durable else None
+        self._wal.put_nowait((entry, done))
+        if done is not None:
+            await done
+
+    @staticmethod
+    def _entry_id(entry: Tuple[str, Any]) -> str:
+        op, target = entry
+        return target if op == "delete" else target.id
+
+    async def _wal_writer(self):
+        """Drain queued records and append them with one write + fsync per batch."""
+        while True:
+            batch = [await self._wal.get()]
+            while not self._wal.empty():
+                batch.append(self._wal.get_nowait())
+            try:
+                # Records are serialized at write time from the live session, so
+                # only the last entry per session in a batch needs writing
+                latest = {self._entry_id(entry): entry for entry, _ in batch}
+                lines = {sid: orjson.dumps(self._record(*entry)) + b"\n" for sid, entry in latest.items()}
+                payload = b"".join(lines.values())
+                await asyncio.to_thread(self._append, payload)
+                self._wal_bytes += len(payload)
+                for sid, line in lines.items():
+                    if latest[sid][0] == "delete":
+                        self._live_bytes.pop(sid, None)
+                    else:
+                        self._live_bytes[sid] = len(line)
+                error = None
+            except Exception as e:
+                error = e
+            for _, done in batch:
+                if done is not None and not done.done():
+                    if error is None:
+                        done.set_result(None)
+                    else:
+                        done.set_exception(error)
+                self._wal.task_done()
+            
+            # The batch is already durable, so a failed rewrite just leaves the
+            # longer log in place until the next attempt
+            live = sum(self._live_bytes.values())
+            if self._wal_bytes > max(WAL_COMPACT_MIN_BYTES, WAL_COMPACT_RATIO * live):
+                try:
+                    await asyncio.to_thread(self._rewrite, self._snapshot())
+                except Exception:
+                    pass
+
+    def _snapshot(self) -> bytes:
+        """One save record per live session, resetting the size bookkeeping to match."""
+        lines = {sid: orjson.dumps(self._record("save", s)) + b"\n" for sid, s in self.sessions.items()}
+        self._live_bytes = {sid: len(line) for sid, line in lines.items()}
+        self._wal_bytes = sum(self._live_bytes.values())
+        return b"".join(lines.values())
+
+    def _rewrite(self, payload: bytes):
+        tmp_path = self._wal_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._wal_path)
+
+    def _append(self, payload: bytes):
+        with open(self._wal_path, "ab") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _replay_wal(self):
+        """Rebuild sessions from the log, then compact it to one record per session."""
+        if not os.path.exists(self._wal_path):
+            return
+        # Runs at import, before the event loop; replayed counts should be exact too
+        load_encoding()
+        with open(self._wal_path, "rb") as f:
+            for line in f:
+                try:
+                    rec = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # Torn final line from a crash
+                if rec.get("op") == "save":
+                    session = Session.model_validate(rec["session"])
+                    session.token_count = sum(count_tokens(m.content) for m in session.messages)
+                    self.sessions[session.id] = session
+                    self._info_index[session.id] = self._info(session)
+                elif rec.get("op") == "delete":
+                    self.sessions.pop(rec.get("id"), None)
+                    self._info_index.pop(rec.get("id"), None)
+        self._rewrite(self._snapshot())
+
+# Plan statuses that count as the session's current plan
+_ACTIVE_STATES = frozenset(("active", "draft"))
+
 class InMemoryPlanRepository(PlanRepository):
     def __init__(self):
-        self.plans: Dict[str, List[Plan]] = {}
+        # Newest plan first
+        self.plans: Dict[str, deque[Plan]] = defaultdict(deque)
+        # Current plan per session; create() completes it when a newer one arrives
+        self._active: Dict[str, Optional[Plan]] = {}
 
     async def get_active(self, session_id: str) -> Optional[Plan]:
-        plans = self.plans.get(session_id, [])
-        return next((p for p in plans if p.status in ["active", "draft"]), None)
+        return self._active.get(session_id)
 
     async def list(self, session_id: str) -> List[Plan]:
-        return self.plans.get(session_id, [])
+        return list(self.plans.get(session_id, ()))
 
     async def create(self, session_id: str, data: PlanCreate) -> Plan:
         plan = Plan(
             title=data.title or "Untitled Plan",
             content=data.content,
         )
-        if session_id not in self.plans:
-            self.plans[session_id] = []
         
-        # Mark previous plans as completed
-        for p in self.plans[session_id]:
-            if p.status != "completed":
-                p.status = "completed"
+        # Only the current plan can still be open, so completing it is enough
+        previous = self._active.get(session_id)
+        if previous is not None:
+            previous.status = "completed"
         
-        self.plans[session_id].insert(0, plan)
+        self.plans[session_id].appendleft(plan)
+        self._active[session_id] = plan
         return plan
 
     async def delete(self, session_id: str, plan_id: str) -> bool:
         if session_id in self.plans:
-            self.plans[session_id] = [p for p in self.plans[session_id] if p.id != plan_id]
+            self.plans[session_id] = deque(p for p in self.plans[session_id] if p.id != plan_id)
+            active = self._active.get(session_id)
+            if active is not None and active.id == plan_id:
+                self._active[session_id] = next(
+                    (p for p in self.plans[session_id] if p.status in _ACTIVE_STATES), None
+                )
             return True
         return False
 
@@ -89,6 +274,10 @@ class InMemoryFileAttachmentRepository(FileAttachmentRepository):
     async def get(self, file_id: str) -> Optional[FileAttachment]:
         return self.attachments.get(file_id)
 
+    async def get_many(self, file_ids: List[str]) -> List[FileAttachment]:
+        found = (self.attachments.get(fid) for fid in file_ids)
+        return [a for a in found if a]
+
     async def delete(self, file_id: str) -> bool:
         if file_id in self.attachments:
             attachment = self.attachments[file_id]
@@ -1,12 +1,20 @@
+import asyncio
+import functools
+import itertools
 import os
 import re
-import subprocess
+import shlex
+import shutil
+import stat
+import urllib.parse
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Optional, Union, Any
+from typing import List, Optional, Any, AsyncIterator, BinaryIO, Iterable, Tuple, Dict
+import httpx
 
 from domain.interfaces import WorkspaceService
 from domain.models import (
-    WorkspaceResponse, WorkspaceUpdate, WorkspaceCreate,
+    WorkspaceResponse,
     FileEntry, InstructionsResponse, Skill,
     ReviewResponse, ReviewResult, ReviewSummary
 )
@@ -20,6 +28,53 @@ You are an AI assistant helping with software development in this workspace.
 - Follow the coding standards of the project.
 - When generating code, include brief explanations.
 """
+DEFAULT_INSTRUCTIONS_BYTES = DEFAULT_INSTRUCTIONS.encode("utf-8")
+
+# Directory listings remembered, keyed by path and checked against the dir mtime
+LISTING_CACHE_SIZE = 256
+
+# Characters stripped from user-supplied workspace and skill names
+_SAFE_NAME = re.compile(r'[^a-zA-Z0-9_\-]')
+_SAFE_NAME_DOT = re.compile(r'[^a-zA-Z0-9_\-\.]')
+
+# Entries read per worker-thread hop when streaming a directory listing
+FILE_STREAM_BATCH = 256
+
+# Bytes per read when copying a raw file body to disk
+FILE_COPY_CHUNK = 64 * 1024
+
+# Anything the shell would interpret; commands without these run directly
+_SHELL_META = re.compile(r"[|&;<>()$`\\\"'*?\[\]#~=%!{}\n]")
+
+
+def _parse_frontmatter(lines: Iterable[str]) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """(name, description) from SKILL.md lines, None when it has no frontmatter.
+
+    Consumes lines only up to the closing ---, so a file's body is never read.
+    """
+    it = iter(lines)
+    if next(it, "").rstrip("\r\n") != "---":
+        return None
+    fields: Dict[str, Optional[str]] = {}
+    for line in it:
+        if line.startswith("---"):
+            return fields.get("name"), fields.get("description")
+        key, sep, value = line.partition(":")
+        key = key.strip()
+        if sep and key in ("name", "description"):
+            fields.setdefault(key, value.strip() or None)
+    return None
+
+
+@functools.lru_cache(maxsize=64)
+def _resolve_workspace(root: str, path: str) -> Tuple[str, bool]:
+    """Resolved workspace path for a UI selection, and whether it stays under root."""
+    target = Path(path)
+    if not target.is_absolute():
+        target = Path(root) / path
+    resolved = target.resolve()
+    return str(resolved), resolved.is_relative_to(Path(root).resolve())
+
 
 class FileSystemWorkspaceService(WorkspaceService):
     def __init__(self):
@@ -30,154 +85,316 @@ class FileSystemWorkspaceService(WorkspaceService):
             except Exception:
                 self.workspaces_root = os.getcwd()
         self.current_workspace = self.workspaces_root
+        # Skill directories per workspace, with the workspace/.claude/.agent mtimes
+        # they were read at; skill and workspace calls also drop it outright
+        self._skill_cache: Dict[str, Tuple[tuple, List[str]]] = {}
+        # path -> (directory mtime, entries); adding, removing or renaming bumps the mtime
+        self._listing_cache: "OrderedDict[str, Tuple[float, List[FileEntry]]]" = OrderedDict()
+        # (root mtime_ns, subdirectories) from the last get_info scan; adding or
+        # removing a workspace bumps the mtime
+        self._subdirs_cache: Optional[Tuple[int, List[str]]] = None
+        # Instructions path -> ((mtime_ns, size), content), reread only when the file changes
+        self._instructions_cache: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        # Shared pooled HTTP client for skill imports, created on first use
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @property
+    def current_workspace(self) -> str:
+        return self._current_workspace
+
+    @current_workspace.setter
+    def current_workspace(self, path: str):
+        # Paths derived from the workspace are built once per switch, not per call
+        self._current_workspace = path
+        self._workspace_path = Path(path)
+        self._github_dir = self._workspace_path / ".github"
+        self._instructions_path = self._github_dir / "copilot-instructions.md"
+        self._claude_skills = self._workspace_path / ".claude" / "skills"
+        self._agent_skills = self._workspace_path / ".agent" / "skills"
+
+    async def stop(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
 
     def get_current(self) -> str:
         return self.current_workspace
 
     async def set_current(self, path: str) -> WorkspaceResponse:
-        target_path = Path(path)
-        if not target_path.is_absolute():
-             target_path = Path(self.workspaces_root) / path
-             
-        if target_path.exists() and target_path.is_dir():
-            self.current_workspace = str(target_path.resolve())
-            return await self.get_info()
+        # Repeat selections skip the realpath walk; only the is_dir stat remains
+        resolved, within_root = _resolve_workspace(self.workspaces_root, path)
+        
+        # Relative names pick a workspace under the root and may not climb out of it
+        if not os.path.isabs(path) and not within_root:
+            raise ValueError("Workspace must be inside the workspaces root")
+            
+        # isdir is a single stat and is False for missing paths
+        if os.path.isdir(resolved):
+            self.current_workspace = resolved
+            self._skill_cache.clear()
+            # Other requests may switch the workspace while the scan awaits,
+            # so the response names this request's workspace explicitly
+            return await self.get_info(resolved)
             
         raise ValueError("Directory does not exist")
 
-    async def get_info(self) -> WorkspaceResponse:
-        subdirectories = []
-        root_path = Path(self.workspaces_root)
+    async def get_info(self, workspace: Optional[str] = None) -> WorkspaceResponse:
+        # Read before any await, so a concurrent switch can't change the answer
+        workspace = workspace or self.current_workspace
+        
+        # One stat decides whether the previous scan is still current
+        try:
+            mtime_ns = os.stat(self.workspaces_root).st_mtime_ns
+        except OSError:
+            mtime_ns = -1
+        cached = self._subdirs_cache
+        if cached is not None and cached[0] == mtime_ns:
+            subdirectories = cached[1]
+        else:
+            subdirectories = await asyncio.to_thread(self._list_subdirectories)
+            self._subdirs_cache = (mtime_ns, subdirectories)
         
-        if root_path.exists():
-            try:
-                subdirectories = [
-                    d.name for d in root_path.iterdir() 
-                    if d.is_dir() and not d.name.startswith('.')
-                ]
-            except Exception:
-                pass
-                
         return WorkspaceResponse(
-            workspace=self.current_workspace,
+            workspace=workspace,
             root=self.workspaces_root,
-            subdirectories=sorted(subdirectories)
+            subdirectories=list(subdirectories),
         )
 
+    def _list_subdirectories(self) -> List[str]:
+        """Sorted names of the visible directories under workspaces_root."""
+        names = []
+        # scandir entries carry their type, so filtering needs no stat per entry
+        try:
+            with os.scandir(self.workspaces_root) as it:
+                for e in it:
+                    name = e.name
+                    if name[:1] != '.' and e.is_dir():
+                        names.append(name)
+        except Exception:
+            pass
+        # Case-insensitive, so "alpha" and "Beta" list the way a person expects
+        names.sort(key=str.lower)
+        return names
+
     async def create(self, name: str) -> WorkspaceResponse:
-        safe_name = re.sub(r'[^a-zA-Z0-9_\-\.]', '', name)
+        safe_name = _SAFE_NAME_DOT.sub('', name)
         if not safe_name:
             raise ValueError("Invalid workspace name")
             
         new_path = Path(self.workspaces_root) / safe_name
         
-        try:
+        def scaffold():
             new_path.mkdir(parents=True, exist_ok=True)
             
-            # Create default instructions
+            # Create default instructions, leaving an existing workspace's own alone;
+            # exclusive mode makes the existence check and the write one step
             github_dir = new_path / ".github"
             github_dir.mkdir(exist_ok=True)
-            instructions_path = github_dir / "copilot-instructions.md"
-            instructions_path.write_text(DEFAULT_INSTRUCTIONS, encoding="utf-8")
+            try:
+                with open(github_dir / "copilot-instructions.md", "xb") as f:
+                    f.write(DEFAULT_INSTRUCTIONS_BYTES)
+            except FileExistsError:
+                pass
+        
+        try:
+            await asyncio.to_thread(scaffold)
             
-            self.current_workspace = str(new_path.resolve())
-            return await self.get_info()
+            resolved = str(new_path.resolve())
+            self.current_workspace = resolved
+            self._skill_cache.clear()
+            return await self.get_info(resolved)
         except Exception as e:
             raise RuntimeError(f"Failed to create workspace: {e}")
 
     async def list_files(self, path: Optional[str] = None) -> List[FileEntry]:
-        dir_path = Path(path or self.current_workspace)
-        if not dir_path.exists():
+        entries, _ = await self.list_files_cached(path)
+        return entries
+
+    async def list_files_cached(self, path: Optional[str] = None) -> Tuple[List[FileEntry], float]:
+        dir_path = path or self.current_workspace
+        try:
+            mtime = os.stat(dir_path).st_mtime
+        except OSError:
             raise ValueError("Directory not found")
         
-        entries = []
-        for entry in dir_path.iterdir():
-            entries.append(FileEntry(
-                name=entry.name,
-                type="directory" if entry.is_dir() else "file",
-                path=str(entry),
-            ))
-        return entries
+        cached = self._listing_cache.get(dir_path)
+        if cached is not None and cached[0] == mtime:
+            self._listing_cache.move_to_end(dir_path)
+            return cached[1], mtime
+        
+        entries = await asyncio.to_thread(self._scan_dir, dir_path)
+        self._listing_cache[dir_path] = (mtime, entries)
+        if len(self._listing_cache) > LISTING_CACHE_SIZE:
+            self._listing_cache.popitem(last=False)
+        return entries, mtime
+
+    @staticmethod
+    def _scan_dir(dir_path: str) -> List[FileEntry]:
+        # scandir reports entry types and joined paths from the directory read itself
+        with os.scandir(dir_path) as it:
+            return [
+                FileEntry(
+                    name=entry.name,
+                    type="directory" if entry.is_dir() else "file",
+                    path=entry.path,
+                )
+                for entry in it
+            ]
+
+    async def iter_files(self, path: Optional[str] = None) -> AsyncIterator[List[FileEntry]]:
+        """Yield a directory's entries in batches as scandir reads them.
+
+        Raises ValueError on the first iteration if the directory is missing.
+        """
+        dir_path = path or self.current_workspace
+        try:
+            it = await asyncio.to_thread(os.scandir, dir_path)
+        except OSError:
+            raise ValueError("Directory not found")
+        
+        def next_batch() -> List[FileEntry]:
+            return [
+                FileEntry(
+                    name=entry.name,
+                    type="directory" if entry.is_dir() else "file",
+                    path=entry.path,
+                )
+                for entry in itertools.islice(it, FILE_STREAM_BATCH)
+            ]
+        
+        try:
+            while batch := await asyncio.to_thread(next_batch):
+                yield batch
+        finally:
+            it.close()
 
     async def read_file(self, path: str) -> str:
         file_path = Path(path)
-        if not file_path.exists():
-            raise ValueError("File not found")
         try:
-            return file_path.read_text(encoding="utf-8")
+            return await asyncio.to_thread(file_path.read_text, encoding="utf-8")
+        except FileNotFoundError:
+            raise ValueError("File not found")
         except Exception as e:
             raise RuntimeError(f"Failed to read file: {e}")
 
+    async def stat_file(self, path: str) -> os.stat_result:
+        try:
+            st = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            raise ValueError("File not found")
+        except OSError as e:
+            raise RuntimeError(f"Failed to read file: {e}")
+        # Directories, FIFOs and devices can't be served as a file
+        if not stat.S_ISREG(st.st_mode):
+            raise ValueError("File not found")
+        # Checked up front: once the response has started it can't turn into an error
+        if not os.access(path, os.R_OK):
+            raise RuntimeError(f"Failed to read file: permission denied: {path!r}")
+        return st
+
     async def write_file(self, path: str, content: str) -> bool:
         file_path = Path(path)
         try:
-            file_path.write_text(content, encoding="utf-8")
+            await asyncio.to_thread(file_path.write_text, content, encoding="utf-8")
             return True
         except Exception as e:
             raise RuntimeError(f"Failed to write file: {e}")
 
-    async def get_instructions(self) -> InstructionsResponse:
-        instructions_path = Path(self.current_workspace) / ".github" / "copilot-instructions.md"
+    async def write_file_from(self, path: str, src: BinaryIO) -> int:
+        try:
+            return await asyncio.to_thread(self._copy_to, src, path)
+        except Exception as e:
+            raise RuntimeError(f"Failed to write file: {e}")
+
+    @staticmethod
+    def _copy_to(src: BinaryIO, path: str) -> int:
+        """Copy a spooled body to disk in fixed-size chunks; runs on a worker thread."""
+        src.seek(0)
+        with open(path, "wb") as dst:
+            shutil.copyfileobj(src, dst, FILE_COPY_CHUNK)
+            return dst.tell()
+
+    async def get_instructions(self, workspace: Optional[str] = None) -> InstructionsResponse:
+        if workspace:
+            instructions_path = Path(workspace) / ".github" / "copilot-instructions.md"
+        else:
+            instructions_path = self._instructions_path
+        key = str(instructions_path)
         content = ""
         
-        if instructions_path.exists():
-            try:
-                content = instructions_path.read_text(encoding="utf-8")
-            except Exception:
-                pass
+        # A missing file fails the stat; no separate exists() check
+        try:
+            st = os.stat(key)
+            stamp = (st.st_mtime_ns, st.st_size)
+            cached = self._instructions_cache.get(key)
+            if cached is not None and cached[0] == stamp:
+                content = cached[1]
+            else:
+                content = await asyncio.to_thread(instructions_path.read_text, encoding="utf-8")
+                self._instructions_cache[key] = (stamp, content)
+        except Exception:
+            pass
                 
-        return InstructionsResponse(content=content, path=str(instructions_path))
+        return InstructionsResponse(content=content, path=key)
 
     async def save_instructions(self, content: str) -> InstructionsResponse:
-        github_dir = Path(self.current_workspace) / ".github"
-        instructions_path = github_dir / "copilot-instructions.md"
+        github_dir = self._github_dir
+        instructions_path = self._instructions_path
         
-        try:
+        def write():
             github_dir.mkdir(exist_ok=True)
             instructions_path.write_text(content, encoding="utf-8")
+        
+        try:
+            await asyncio.to_thread(write)
             return InstructionsResponse(content=content, path=str(instructions_path))
         except Exception as e:
             raise RuntimeError(f"Failed to save instructions: {e}")
 
     async def get_skills(self) -> List[Skill]:
         """Get all skills from both .claude/skills and .agent/skills directories."""
-        skills = []
-        skill_dirs = [
-            Path(self.current_workspace) / ".claude" / "skills",
-            Path(self.current_workspace) / ".agent" / "skills",
-        ]
-        
-        for skills_dir in skill_dirs:
-            if not skills_dir.exists():
+        candidates = await asyncio.to_thread(self._skill_candidates)
+        # Each SKILL.md read is independent, so they overlap on the thread pool
+        loaded = await asyncio.gather(
+            *(asyncio.to_thread(self._load_skill, path, dir_name) for path, dir_name in candidates)
+        )
+        return [skill for skill in loaded if skill is not None]
+
+    def _skill_candidates(self) -> List[Tuple[str, str]]:
+        candidates = []
+        for skills_dir in (self._claude_skills, self._agent_skills):
+            try:
+                with os.scandir(skills_dir) as it:
+                    # Plain string joins; no Path objects per entry
+                    candidates += [(os.path.join(e.path, "SKILL.md"), e.name) for e in it if e.is_dir()]
+            except OSError:
                 continue
-            
-            for entry in skills_dir.iterdir():
-                if entry.is_dir():
-                    skill_path = entry / "SKILL.md"
-                    if skill_path.exists():
-                        try:
-                            content = skill_path.read_text(encoding="utf-8")
-                            frontmatter_match = re.match(r"^---\n([\s\S]*?)\n---", content)
-                            if frontmatter_match:
-                                frontmatter = frontmatter_match.group(1)
-                                name_match = re.search(r"name:\s*(.+)", frontmatter)
-                                desc_match = re.search(r"description:\s*(.+)", frontmatter)
-                                skills.append(Skill(
-                                    name=name_match.group(1) if name_match else entry.name,
-                                    description=desc_match.group(1) if desc_match else "No description",
-                                    path=str(skill_path),
-                                ))
-                        except Exception:
-                            pass
-        return skills
+        return candidates
+
+    @staticmethod
+    def _load_skill(skill_path: str, dir_name: str) -> Optional[Skill]:
+        # A missing SKILL.md fails the read, which skips the entry
+        try:
+            with open(skill_path, encoding="utf-8") as f:
+                fields = _parse_frontmatter(f)
+        except Exception:
+            return None
+        if not fields:
+            return None
+        name, description = fields
+        return Skill(
+            name=name or dir_name,
+            description=description or "No description",
+            path=skill_path,
+        )
 
     async def create_skill(self, name: str) -> Skill:
         """Create a new skill with a template SKILL.md file."""
-        safe_name = re.sub(r'[^a-zA-Z0-9_\-]', '', name)
+        safe_name = _SAFE_NAME.sub('', name)
         if not safe_name:
             raise ValueError("Invalid skill name")
         
-        skills_dir = Path(self.current_workspace) / ".claude" / "skills"
+        skills_dir = self._claude_skills
         skill_dir = skills_dir / safe_name
         
         if skill_dir.exists():
@@ -185,6 +402,7 @@ class FileSystemWorkspaceService(WorkspaceService):
         
         try:
             skill_dir.mkdir(parents=True, exist_ok=True)
+            self._skill_cache.clear()
             skill_path = skill_dir / "SKILL.md"
             
             template = f"""---
@@ -206,7 +424,7 @@ Provide examples and instructions for using this skill.
 
 List any commands or workflows this skill supports.
 """
-            skill_path.write_text(template, encoding="utf-8")
+            await asyncio.to_thread(skill_path.write_text, template, encoding="utf-8")
             
             return Skill(
                 name=safe_name,
@@ -218,35 +436,34 @@ List any commands or workflows this skill supports.
 
     async def import_skill(self, url: str) -> Skill:
         """Import a skill from a URL (GitHub URL or raw URL to SKILL.md)."""
-        import urllib.request
-        import urllib.error
-        import urllib.parse
-        
-        # Validate URL
-        if not url.startswith("http://") and not url.startswith("https://"):
+        # One parse drives validation, the GitHub rewrite and the name below
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
             raise ValueError("URL must start with http:// or https://")
         
         # URL decode any encoded characters (e.g., %2F -> /)
-        url = urllib.parse.unquote(url)
+        path = urllib.parse.unquote(parts.path)
         
         # Convert GitHub blob URLs to raw URLs
         # https://github.com/user/repo/blob/branch/path -> https://raw.githubusercontent.com/user/repo/branch/path
-        if "github.com" in url and "/blob/" in url:
-            url = url.replace("github.com", "raw.githubusercontent.com").replace("/blob/", "/")
+        if parts.hostname == "github.com" and "/blob/" in path:
+            parts = parts._replace(netloc="raw.githubusercontent.com")
+            path = path.replace("/blob/", "/", 1)
+        url = urllib.parse.urlunsplit(parts._replace(path=path))
         
         # Extract skill name from URL
         # Expected format: .../skills/{skill-name}/SKILL.md or similar
-        url_parts = url.rstrip("/").split("/")
+        url_parts = path.rstrip("/").split("/")
         if "SKILL.md" in url_parts[-1]:
             skill_name = url_parts[-2] if len(url_parts) >= 2 else "imported-skill"
         else:
             skill_name = url_parts[-1].replace(".md", "") if url_parts else "imported-skill"
         
-        safe_name = re.sub(r'[^a-zA-Z0-9_\-]', '', skill_name)
+        safe_name = _SAFE_NAME.sub('', skill_name)
         if not safe_name:
             safe_name = "imported-skill"
         
-        skills_dir = Path(self.current_workspace) / ".claude" / "skills"
+        skills_dir = self._claude_skills
         skill_dir = skills_dir / safe_name
         
         if skill_dir.exists():
@@ -254,9 +471,15 @@ List any commands or workflows this skill supports.
         
         try:
             # Fetch content from URL
-            req = urllib.request.Request(url, headers={"User-Agent": "CopilotSDK/1.0"})
-            with urllib.request.urlopen(req, timeout=30) as response:
-                content = response.read().decode("utf-8")
+            if self._http is None:
+                self._http = httpx.AsyncClient(
+                    timeout=30,
+                    headers={"User-Agent": "CopilotSDK/1.0"},
+                    follow_redirects=True,
+                )
+            response = await self._http.get(url)
+            response.raise_for_status()
+            content = response.text
             
             # Validate it looks like a SKILL.md (has frontmatter)
             if not content.strip().startswith("---"):
@@ -264,60 +487,58 @@ List any commands or workflows this skill supports.
             
             # Create skill directory and file
             skill_dir.mkdir(parents=True, exist_ok=True)
+            self._skill_cache.clear()
             skill_path = skill_dir / "SKILL.md"
-            skill_path.write_text(content, encoding="utf-8")
+            await asyncio.to_thread(skill_path.write_text, content, encoding="utf-8")
             
             # Parse the frontmatter to get the name and description
-            frontmatter_match = re.match(r"^---\n([\s\S]*?)\n---", content)
+            fields = _parse_frontmatter(content.splitlines())
             name = safe_name
             description = "Imported skill"
             
-            if frontmatter_match:
-                frontmatter = frontmatter_match.group(1)
-                name_match = re.search(r"name:\s*(.+)", frontmatter)
-                desc_match = re.search(r"description:\s*(.+)", frontmatter)
-                if name_match:
-                    name = name_match.group(1).strip()
-                if desc_match:
-                    description = desc_match.group(1).strip()
+            if fields:
+                if fields[0]:
+                    name = fields[0].strip()
+                if fields[1]:
+                    description = fields[1].strip()
             
             return Skill(
                 name=name,
                 description=description,
                 path=str(skill_path),
             )
-        except urllib.error.URLError as e:
+        except httpx.HTTPError as e:
             raise RuntimeError(f"Failed to fetch URL: {e}")
         except Exception as e:
             # Clean up on failure
             if skill_dir.exists():
-                import shutil
                 shutil.rmtree(skill_dir, ignore_errors=True)
             raise RuntimeError(f"Failed to import skill: {e}")
 
     async def delete_skill(self, name: str) -> bool:
         """Delete a skill by name from .claude/skills directory."""
-        import shutil
-        
-        safe_name = re.sub(r'[^a-zA-Z0-9_\-]', '', name)
+        safe_name = _SAFE_NAME.sub('', name)
         if not safe_name:
             raise ValueError("Invalid skill name")
         
         # Check both skill directories
         skill_dirs = [
-            Path(self.current_workspace) / ".claude" / "skills" / safe_name,
-            Path(self.current_workspace) / ".agent" / "skills" / safe_name,
+            self._claude_skills / safe_name,
+            self._agent_skills / safe_name,
         ]
         
         deleted = False
         for skill_dir in skill_dirs:
-            if skill_dir.exists() and skill_dir.is_dir():
-                try:
-                    shutil.rmtree(skill_dir)
-                    deleted = True
-                except Exception as e:
-                    raise RuntimeError(f"Failed to delete skill: {e}")
+            # rmtree fails fast on a missing path, so no stat beforehand
+            try:
+                await asyncio.to_thread(shutil.rmtree, skill_dir)
+                deleted = True
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            except Exception as e:
+                raise RuntimeError(f"Failed to delete skill: {e}")
         
+        self._skill_cache.clear()
         if not deleted:
             raise ValueError(f"Skill '{name}' not found")
         
@@ -325,45 +546,73 @@ List any commands or workflows this skill supports.
 
     async def get_skill_directories(self, workspace: Optional[str] = None) -> List[str]:
         """Get list of skill directories relative to workspace for SDK."""
-        dirs = []
-        potential_dirs = [".claude/skills", ".agent/skills"]
         target_workspace = workspace or self.current_workspace
+        # .claude/.agent appearing changes the workspace mtime, and a skills
+        # directory appearing under them changes theirs
+        stamp = tuple(
+            self._mtime_ns(p)
+            for p in (target_workspace, os.path.join(target_workspace, ".claude"), os.path.join(target_workspace, ".agent"))
+        )
+        cached = self._skill_cache.get(target_workspace)
+        if cached is not None and cached[0] == stamp:
+            return list(cached[1])
+        
+        # One readdir of the workspace tells which of .claude/.agent exist;
+        # only those get a stat for their skills subdirectory
+        try:
+            with os.scandir(target_workspace) as it:
+                top = {e.name: e for e in it if e.name in (".claude", ".agent") and e.is_dir()}
+        except OSError:
+            top = {}
         
-        for d in potential_dirs:
-            full_path = Path(target_workspace) / d
-            if full_path.exists() and full_path.is_dir():
-                dirs.append(d)
+        dirs = []
+        for parent in (".claude", ".agent"):
+            entry = top.get(parent)
+            if entry is not None and os.path.isdir(os.path.join(entry.path, "skills")):
+                dirs.append(f"{parent}/skills")
         
-        return dirs
+        self._skill_cache[target_workspace] = (stamp, dirs)
+        return list(dirs)
+
+    @staticmethod
+    def _mtime_ns(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
 
     async def run_review(self, workspace: Optional[str] = None) -> ReviewResponse:
         cwd = workspace or self.current_workspace
         try:
-            result = subprocess.run(
-                ["git", "status", "--porcelain"],
+            proc = await asyncio.create_subprocess_exec(
+                "git", "status", "--porcelain",
                 cwd=cwd,
-                capture_output=True,
-                text=True,
-                shell=True,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
             )
-            lines = result.stdout.strip().split("\n") if result.stdout.strip() else []
+            stdout, _ = await proc.communicate()
             
+            # Warnings are counted as results are built; splitlines also keeps
+            # the leading status space that strip() used to eat on line one.
+            # Lines are split as bytes, so only each file name is decoded, and
+            # the fields are known-good, so results skip validation
             results = []
-            for line in lines:
+            warnings = 0
+            for line in stdout.splitlines():
                 if line:
-                    status = line[:2]
-                    file = line[3:]
-                    results.append(ReviewResult(
-                        file=file,
-                        status="warning" if "M" in status else "ok",
+                    is_warning = b"M" in line[:2]
+                    warnings += is_warning
+                    results.append(ReviewResult.model_construct(
+                        file=line[3:].decode("utf-8", errors="replace"),
+                        status="warning" if is_warning else "ok",
                         issues=[],
                     ))
             
-            return ReviewResponse(
+            return ReviewResponse.model_construct(
                 results=results,
                 summary=ReviewSummary(
                     total=len(results),
-                    warnings=len([r for r in results if r.status == "warning"]),
+                    warnings=warnings,
                     errors=0,
                 ),
             )
@@ -373,19 +622,59 @@ List any commands or workflows this skill supports.
                 summary=ReviewSummary(total=0, warnings=0, errors=0),
             )
 
-    async def execute_command(self, command: str, cwd: Optional[str] = None) -> Any:
+    async def execute_command(self, command: str, cwd: Optional[str] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Run a shell command and yield its output as it is produced.
+
+        Yields ("stdout" | "stderr", bytes) chunks in arrival order, then a
+        final ("exit", returncode).
+        """
+        # Plain "program args..." commands skip the intermediate shell process;
+        # builtins and anything using shell syntax still go through the shell
+        argv = None if _SHELL_META.search(command) else shlex.split(command)
         try:
-            result = subprocess.run(
-                command,
-                cwd=cwd or self.current_workspace,
-                shell=True,
-                capture_output=True,
-                text=True,
-            )
-            return {
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "returncode": result.returncode
-            }
+            if argv and shutil.which(argv[0]):
+                proc = await asyncio.create_subprocess_exec(
+                    *argv,
+                    cwd=cwd or self.current_workspace,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+            else:
+                proc = await asyncio.create_subprocess_shell(
+                    command,
+                    cwd=cwd or self.current_workspace,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                )
         except Exception as e:
             raise RuntimeError(str(e))
+        
+        chunks: asyncio.Queue = asyncio.Queue()
+        
+        async def pump(name: str, stream: asyncio.StreamReader):
+            while chunk := await stream.read(4096):
+                await chunks.put((name, chunk))
+            await chunks.put((name, None))
+        
+        pumps = [
+            asyncio.create_task(pump("stdout", proc.stdout)),
+            asyncio.create_task(pump("stderr", proc.stderr)),
+        ]
+        try:
+            open_streams = len(pumps)
+            while open_streams:
+                name, chunk = await chunks.get()
+                if chunk is None:
+                    open_streams -= 1
+                else:
+                    yield name, chunk
+            yield "exit", await proc.wait()
+        finally:
+            for task in pumps:
+                task.cancel()
+            # Consumer went away early (e.g. socket closed): don't leave it running
+            if proc.returncode is None:
+                try:
+                    proc.kill()
+                except ProcessLookupError:
+                    pass
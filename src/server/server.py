@@ -1,12 +1,15 @@
 """
 Copilot SDK UI - Python FastAPI Server (Refactored)
 """
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from api.deps import get_copilot_service
+from api.deps import get_copilot_service, get_session_repo, get_workspace_service
+from api.responses import FastJSONResponse
 from api.routers import models, sessions, workspace, skills, settings, mcp, chat, uploads
+from domain.tokens import load_encoding
 
-app = FastAPI(title="Copilot SDK UI Server", version="2.0.0")
+app = FastAPI(title="Copilot SDK UI Server", version="2.0.0", default_response_class=FastJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -30,6 +33,8 @@ app.include_router(uploads.router)
 @app.on_event("startup")
 async def startup_event():
     print("DEBUG: Starting up server...")
+    # May fetch encoding data over the network, so keep it off the event loop
+    await asyncio.to_thread(load_encoding)
     service = get_copilot_service()
     try:
         await service.start()
@@ -50,6 +55,9 @@ async def startup_event():
 async def shutdown_event():
     service = get_copilot_service()
     await service.stop()
+    await get_workspace_service().stop()
+    # Make sure queued session log records reach disk
+    await get_session_repo().flush()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,42 +1,109 @@
-import requests
+import asyncio
+import random
+import httpx
 import time
 import sys
 
 BASE_URL = "http://localhost:3001/api"
 WS_NAME = "test_ws_instructions_beta"
 
-def verify_instructions():
-    print(f"Creating workspace '{WS_NAME}'...")
-    try:
-        # Create workspace
-        res = requests.post(f"{BASE_URL}/workspaces/create", json={"name": WS_NAME})
-        if res.status_code != 200:
-            print(f"❌ Failed to create workspace: {res.text}")
+# Per-call limits: fail fast on connect, allow the server a few seconds to answer
+TIMEOUT = httpx.Timeout(5.0, connect=1.0)
+
+# Transient statuses worth another try; other 4xx are real answers and surface at once
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+# Present in the default instructions; none need JSON escaping, so they can be
+# matched in the raw response body
+MARKERS = ("# Copilot Instructions", "Guidelines")
+
+async def with_retry(send, attempts: int = 4, base: float = 0.1, cap: float = 2.0) -> httpx.Response:
+    """Await send(), retrying transport errors and transient statuses with full jitter."""
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        try:
+            res = await send()
+        except httpx.TransportError:
+            if last:
+                raise
+        else:
+            if last or res.status_code not in RETRY_STATUSES:
+                return res
+            # Release the connection of a discarded (possibly streamed) response
+            await res.aclose()
+        await asyncio.sleep(random.uniform(0, min(cap, base * 2 ** attempt)))
+
+async def wait_ready(client: httpx.AsyncClient, url: str, deadline: float = 10.0):
+    """Poll until the server answers at all, backing off with jitter."""
+    start = time.monotonic()
+    attempt = 0
+    while True:
+        try:
+            # Any HTTP response, error status included, means the server is listening
+            await client.get(url, timeout=0.5)
             return
-            
-        print("✅ Workspace created.")
-        
-        # Check instructions
-        print("Checking for default instructions...")
-        res = requests.get(f"{BASE_URL}/workspace/instructions")
-        if res.status_code == 200:
-            data = res.json()
-            content = data.get("content", "")
-            if "# Copilot Instructions" in content and "Guidelines" in content:
-                print("✅ Default instructions found:")
-                print("---")
-                print(content[:100] + "...")
-                print("---")
-            else:
-                print("❌ Instructions file found but content mismatch.")
-                print(f"Content: {content}")
+        except httpx.TransportError:
+            if time.monotonic() > start + deadline:
+                raise TimeoutError(f"Server not ready after {deadline}s")
+        await asyncio.sleep(min(0.05 * 2 ** attempt, 0.5) + random.uniform(0, 0.05))
+        attempt += 1
+
+async def find_markers(res: httpx.Response, markers=MARKERS) -> tuple[bool, str]:
+    """Scan a streamed body for every marker, stopping at the chunk that completes them.
+
+    Returns whether all were seen and the first 100 characters read, for reporting.
+    """
+    pending = set(markers)
+    # Carried between chunks so a marker split across a boundary still matches
+    keep = max(map(len, markers)) - 1
+    head = tail = ""
+    async for chunk in res.aiter_text():
+        if len(head) < 100:
+            head = (head + chunk)[:100]
+        window = tail + chunk
+        pending = {m for m in pending if m not in window}
+        if not pending:
+            return True, head
+        tail = window[-keep:]
+    return False, head
+
+async def verify_instructions(client: httpx.AsyncClient, ws_name: str = WS_NAME):
+    print(f"Creating workspace '{ws_name}'...")
+    try:
+        # Create workspace and read its instructions in one round trip, streamed
+        # so the check can stop reading as soon as both markers have arrived
+        req = client.build_request("POST", "/workspaces/create_and_fetch_instructions", json={"name": ws_name})
+        res = await with_retry(lambda: client.send(req, stream=True))
+        try:
+            if res.status_code != 200:
+                await res.aread()
+                print(f"❌ [{ws_name}] Failed to create workspace: {res.text}")
+                return
+
+            print(f"✅ [{ws_name}] Workspace created.")
+
+            # Check instructions
+            found, head = await find_markers(res)
+        finally:
+            await res.aclose()
+        if found:
+            print(f"✅ [{ws_name}] Default instructions found.")
         else:
-            print(f"❌ Failed to get instructions: {res.status_code}")
-            
+            print(f"❌ [{ws_name}] Instructions file found but content mismatch.")
+            print(f"Response: {head}...")
+
     except Exception as e:
-        print(f"❌ Error: {e}")
+        print(f"❌ [{ws_name}] Error: {e}")
+
+async def verify_many(names):
+    # One keep-alive client shared by every check
+    limits = httpx.Limits(max_connections=1, keepalive_expiry=30)
+    async with httpx.AsyncClient(base_url=BASE_URL, limits=limits, timeout=TIMEOUT) as client:
+        await wait_ready(client, "/workspace")
+        # One at a time: creating a workspace switches the server's single
+        # current workspace, so overlapping checks could validate each other's
+        for name in names:
+            await verify_instructions(client, name)
 
 if __name__ == "__main__":
-    # Wait for server startup
-    time.sleep(2)
-    verify_instructions()
+    asyncio.run(verify_many(sys.argv[1:] or [WS_NAME]))